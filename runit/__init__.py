@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# @GitHub  : https://github.com/lartpang
+
+from .engine import Scheduler, get_args, run
+from .host import HostResourcePolicy
+from .jobs import STATUS, Job, JobTable
+from .policy import AdaptiveMemoryPolicy, ExclusiveGPUPolicy, MemoryPolicy, Policy
+
+__all__ = [
+    "STATUS",
+    "AdaptiveMemoryPolicy",
+    "ExclusiveGPUPolicy",
+    "HostResourcePolicy",
+    "Job",
+    "JobTable",
+    "MemoryPolicy",
+    "Policy",
+    "Scheduler",
+    "get_args",
+    "run",
+]
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+# @GitHub  : https://github.com/lartpang
+
+import argparse
+import json
+import logging
+import math
+import random
+import sys
+import time
+
+from .placement import PLACEMENTS
+from .simulate import get_candidates, simulate
+
+logger = logging.getLogger("runit")
+
+
+def make_gpus(num_gpus: int, memory: int):
+    return [{"id": i, "memory": memory} for i in range(num_gpus)]
+
+
+def make_jobs(rng: random.Random, num_jobs: int, num_gpus_choices, memory_range, duration_median, priorities=(0,)):
+    job_infos = []
+    for i in range(num_jobs):
+        job_infos.append(
+            {
+                "name": f"job{i}",
+                "command": f"python train.py --id {i}",
+                "num_gpus": rng.choice(num_gpus_choices),
+                "memory": rng.randrange(*memory_range, 512),
+                # 对数正态分布的运行时长：大多数任务较短，少数任务很长
+                "estimated_duration": round(rng.lognormvariate(math.log(duration_median), 0.8)),
+                "priority": rng.choice(priorities),
+            }
+        )
+    return job_infos
+
+
+# 合成的负载：名字 -> 生成 (gpu_infos, job_infos, config) 的函数
+WORKLOADS = {
+    # 8张24G的卡上混合了单卡和多卡任务
+    "mixed-1k": lambda rng: (
+        make_gpus(8, 24576),
+        make_jobs(rng, 1000, (1, 1, 1, 1, 2, 2, 4), (1024, 20480), 600),
+        {},
+    ),
+    # 大量的单卡小任务，主要考察调度本身的开销
+    "small-2k": lambda rng: (
+        make_gpus(16, 24576),
+        make_jobs(rng, 2000, (1,), (512, 4096), 120),
+        {},
+    ),
+    # 显存需求接近单卡容量，容易产生碎片
+    "tight-1k": lambda rng: (
+        make_gpus(4, 11264),
+        make_jobs(rng, 1000, (1, 1, 2), (4096, 11264), 300),
+        {},
+    ),
+    # 带优先级的宽任务，使用EASY backfilling
+    "wide-backfill-1k": lambda rng: (
+        make_gpus(8, 24576),
+        make_jobs(rng, 1000, (1, 1, 2, 4, 8), (2048, 16384), 900, priorities=(0, 0, 1, 2)),
+        {"backfill": True},
+    ),
+}
+
+
+def run_benchmark(workloads, placements, seed=0):
+    for workload in workloads:
+        gpu_infos, job_infos, config = WORKLOADS[workload](random.Random(seed))
+        for name, policy_cls, policy_config in get_candidates(config, placements):
+            start_time = time.perf_counter()
+            result = simulate(policy_cls(), gpu_infos, job_infos, policy_config)
+            result["wall_time"] = time.perf_counter() - start_time
+            yield f"{workload}:{name}", result
+
+
+def compare(results: dict, baseline: dict, tolerance: float):
+    # 返回调度开销超出基线 `1 + tolerance` 倍的条目；调度结果的变化只做提示
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        base = baseline[key]
+        if result["makespan"] != base["makespan"]:
+            print(f"{key}: the makespan changed from {base['makespan']:.1f} to {result['makespan']:.1f}.")
+        if result["cpu_per_job"] > base["cpu_per_job"] * (1 + tolerance):
+            regressions.append(key)
+            print(
+                f"{key}: the CPU time per job increased from "
+                f"{base['cpu_per_job'] * 1e6:.1f}us to {result['cpu_per_job'] * 1e6:.1f}us."
+            )
+    return regressions
+
+
+def get_args():
+    # fmt: off
+    parser = argparse.ArgumentParser(description="Run the policies on synthetic workloads on a virtual clock, and report the quality of the schedules and the cost of the scheduler.")
+    parser.add_argument("--workloads", type=str, nargs="+", default=list(WORKLOADS), choices=list(WORKLOADS), help="The synthetic workloads to run.")
+    parser.add_argument("--placements", type=str, nargs="+", default=list(PLACEMENTS), choices=list(PLACEMENTS), help="The placements of the memory-based policy to compare.")
+    parser.add_argument("--seed", type=int, default=0, help="The seed for generating the workloads.")
+    parser.add_argument("--save", type=str, help="Save the results to a json, to be used as a baseline later.")
+    parser.add_argument("--baseline", type=str, help="Compare with the results saved by `--save`, and exit with 1 if the scheduler becomes slower.")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="The allowed relative increase of the CPU time per job compared with the baseline.")
+    # fmt: on
+    return parser.parse_args()
+
+
+def main():
+    args = get_args()
+    # 模拟时不输出每个任务的调度日志
+    logger.setLevel(logging.ERROR)
+
+    print(
+        f"{'Workload:Policy':<42}{'Makespan(s)':>13}{'Mean Wait(s)':>14}{'GPU Util':>10}"
+        f"{'Passes':>8}{'CPU/Pass(us)':>14}{'CPU/Job(us)':>13}{'Wall(s)':>9}"
+    )
+    results = {}
+    for key, result in run_benchmark(args.workloads, args.placements, seed=args.seed):
+        results[key] = result
+        print(
+            f"{key:<42}{result['makespan']:>13.0f}{result['mean_queue_wait']:>14.0f}{result['gpu_utilization']:>10.2%}"
+            f"{result['num_passes']:>8}{result['cpu_per_pass'] * 1e6:>14.1f}{result['cpu_per_job'] * 1e6:>13.1f}"
+            f"{result['wall_time']:>9.2f}"
+        )
+
+    if args.save:
+        with open(args.save, mode="w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+    if args.baseline:
+        with open(args.baseline, mode="r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
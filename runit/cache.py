@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+# @GitHub  : https://github.com/lartpang
+
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from .jobs import STATUS
+from .metrics import write_atomic
+
+logger = logging.getLogger(__name__)
+
+
+def iter_files(path: str):
+    # 文件本身，或目录下的所有文件（按相对路径排序），返回 (相对路径, 路径)
+    if not os.path.isdir(path):
+        yield "", path
+        return
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            file_path = os.path.join(root, name)
+            yield os.path.relpath(file_path, path), file_path
+
+
+def snapshot(path: str):
+    # 路径下每个文件的 (大小, 修改时间)，路径不存在时返回None
+    if not os.path.exists(path):
+        return None
+    files = {}
+    for rel_path, file_path in iter_files(path):
+        stat = os.stat(file_path)
+        files[rel_path] = [stat.st_size, stat.st_mtime_ns]
+    return files
+
+
+class ResultCache:
+    """按内容寻址的任务结果缓存：命令、`env` 和输入文件的内容都与一次成功的运行相同，且其输出完好时，直接跳过任务。
+
+    只有声明了 `outputs` 的任务参与缓存，`inputs` 与 `outputs` 都是文件或目录的列表（可以使用sweep的占位符）：
+
+    ```yaml
+    - name: eval-{ckpt}
+      command: "python eval.py --ckpt ./ckpts/{ckpt}.pth --out ./results/{ckpt}.json"
+      inputs: ["./ckpts/{ckpt}.pth", "./eval.py"]
+      outputs: ["./results/{ckpt}.json"]
+    ```
+
+    任务可以被调度（进入等待队列）时在后台线程中计算key，因此上游任务产生的输入也会被计入，且读取大文件不会阻塞调度；
+    key计算完成前任务暂不启动，命中时不占用任何GPU，任务直接成为DONE。
+    输入文件的摘要按 (路径, 大小, 修改时间) 缓存在 `digests.json` 中，每次有新的摘要时写入，
+    未变化的大文件（如checkpoint）不会被重新读取；
+    输出只记录大小和修改时间，被删除或修改后缓存失效。成功的运行追加记录在 `results.jsonl` 中。
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = os.path.expanduser(cache_dir)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.digests_path = os.path.join(self.cache_dir, "digests.json")
+        self.results_path = os.path.join(self.cache_dir, "results.jsonl")
+
+        self.digests = {}  # 绝对路径 -> [大小, 修改时间, sha256]
+        if os.path.exists(self.digests_path):
+            with open(self.digests_path, mode="r", encoding="utf-8") as f:
+                self.digests = json.load(f)
+        self.results = {}  # key -> 最近一次成功运行的记录
+        if os.path.exists(self.results_path):
+            with open(self.results_path, mode="r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.results[record["key"]] = record
+        self.file = open(self.results_path, mode="a", encoding="utf-8")
+        self.keys = {}  # job_id -> key，计算失败时为None
+        self.requested = set()  # 已经提交给后台线程计算key的任务
+        self.checked = set()  # 已经检查过是否命中的任务
+        self.num_hits = 0
+        self.digests_changed = False
+
+        self.requests = queue.Queue()
+        self.thread = None
+
+    def attach(self, scheduler):
+        self.scheduler = scheduler
+        self.thread = threading.Thread(target=self.loop, daemon=True)
+        self.thread.start()
+
+    def on_submit(self, job):
+        pass
+
+    def loop(self):
+        # 只有这个线程读写 `digests`
+        while True:
+            item = self.requests.get()
+            if item is None:
+                return
+            job_id, job_info = item
+            try:
+                key = self.get_key(job_info)
+            except OSError as e:
+                logger.warning(f"Failed to hash the inputs of job {job_info.get('name', job_id)}: {e}")
+                key = None
+            if self.digests_changed:
+                self.digests_changed = False
+                write_atomic(self.digests_path, json.dumps(self.digests))
+            # 由调度主线程记录结果，同时唤醒调度器
+            self.scheduler.events.put((self.keys.__setitem__, (job_id, key)))
+
+    def request(self, job):
+        if not job.info.get("outputs") or job.job_id in self.requested:
+            return
+        self.requested.add(job.job_id)
+        self.requests.put((job.job_id, job.info))
+
+    def is_ready(self, job):
+        """job不参与缓存或其key已经计算完成时返回True，否则（在后台）开始计算并返回False。"""
+        if not job.info.get("outputs") or job.job_id in self.keys:
+            return True
+        self.request(job)
+        return False
+
+    def get_file_digest(self, path: str):
+        stat = os.stat(path)
+        abs_path = os.path.abspath(path)
+        cached = self.digests.get(abs_path)
+        if cached is not None and cached[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return cached[2]
+        sha256 = hashlib.sha256()
+        with open(path, mode="rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                sha256.update(chunk)
+        self.digests[abs_path] = [stat.st_size, stat.st_mtime_ns, sha256.hexdigest()]
+        self.digests_changed = True
+        return sha256.hexdigest()
+
+    def get_digest(self, path: str):
+        # 目录的摘要由其中每个文件的相对路径和摘要组成，不存在的输入记为None
+        if not os.path.exists(path):
+            return None
+        sha256 = hashlib.sha256()
+        for rel_path, file_path in iter_files(path):
+            sha256.update(f"{rel_path}\0{self.get_file_digest(file_path)}\n".encode("utf-8"))
+        return sha256.hexdigest()
+
+    def get_key(self, job_info: dict):
+        content = {
+            "command": job_info["command"],
+            "env": {k: str(v) for k, v in job_info.get("env", {}).items()},
+            "inputs": {path: self.get_digest(path) for path in job_info.get("inputs", [])},
+        }
+        return hashlib.sha256(json.dumps(content, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def lookup(self, job):
+        """返回job命中的成功记录，没有时返回None；每个任务只在key计算完成后第一次被调度时检查。"""
+        if self.keys.get(job.job_id) is None or job.job_id in self.checked:
+            return None
+        self.checked.add(job.job_id)
+        record = self.results.get(self.keys[job.job_id])
+        if record is None:
+            return None
+        for path, files in record["outputs"].items():
+            if snapshot(path) != files:
+                logger.info(f"The output {path} of job {job.name} has changed since {record['time']}, rerun it.")
+                return None
+        self.num_hits += 1
+        return record
+
+    def on_status(self, job):
+        if job.status is STATUS.WAITING:
+            # 上游任务都已完成，输入已经就绪
+            self.request(job)
+            return
+        if job.status is not STATUS.DONE or self.keys.get(job.job_id) is None or job.start_time is None:
+            return
+        record = {
+            "key": self.keys[job.job_id],
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "command": job.info["command"],
+            "outputs": {path: snapshot(path) for path in job.info["outputs"]},
+        }
+        missing = [path for path, files in record["outputs"].items() if files is None]
+        if missing:
+            logger.warning(f"Job {job.name} did not produce its outputs {missing}, its result is not cached.")
+            return
+        self.results[record["key"]] = record
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.file.flush()
+
+    def close(self):
+        if self.thread is not None:
+            self.requests.put(None)
+            self.thread.join()
+        self.file.close()
+        write_atomic(self.digests_path, json.dumps(self.digests))
+        if self.num_hits:
+            logger.info(f"Skipped {self.num_hits} jobs with cached results in {self.cache_dir}.")
@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+# @GitHub  : https://github.com/lartpang
+
+import argparse
+import json
+import logging
+import socket
+import socketserver
+import threading
+from collections import deque
+
+from .engine import Scheduler, get_args, load_config, run, setup_logger
+from .jobs import Job
+from .launcher import AsyncLauncher, Launcher
+from .policy import ExclusiveGPUPolicy, MemoryPolicy, Policy
+
+logger = logging.getLogger("runit.cluster")
+
+POLICIES = {"exclusive": ExclusiveGPUPolicy, "memory": MemoryPolicy}
+
+
+def send_message(sock: socket.socket, message: dict, lock: threading.Lock = None):
+    data = (json.dumps(message) + "\n").encode("utf-8")
+    if lock is None:
+        sock.sendall(data)
+    else:
+        with lock:
+            sock.sendall(data)
+
+
+def to_global_id(host: str, gpu_id):
+    return f"{host}/{gpu_id}"
+
+
+def to_local_id(gpu_id: str):
+    return gpu_id.split("/", 1)[1]
+
+
+class MultiHostPolicy(Policy):
+    """每个主机各自使用一个子策略，保证一个任务的所有GPU都位于同一个主机上。
+
+    GPU的ID形如 `<host>/<gpu id>`。
+    """
+
+    def __init__(self, policy_cls):
+        self.policy_cls = policy_cls
+
+    def setup(self, gpu_infos: list, config: dict):
+        host_gpu_infos = {}
+        for gpu_info in gpu_infos:
+            host_gpu_infos.setdefault(gpu_info["id"].split("/", 1)[0], []).append(gpu_info)
+        self.policies = {}
+        for host, infos in host_gpu_infos.items():
+            self.policies[host] = self.policy_cls()
+            self.policies[host].setup(infos, config)
+        self.num_gpus = max(len(x) for x in host_gpu_infos.values())
+
+    def check(self, job_id: int, job_info: dict, warn: bool = True):
+        # 只需要存在一个可以容纳该任务的主机（GPU的数量和 `requires` 都满足）
+        error = None
+        for policy in self.policies.values():
+            try:
+                policy.check(job_id, job_info, warn)
+                return
+            except ValueError as e:
+                error = e
+        raise error
+
+    def job_shape(self, job_info: dict) -> tuple:
+        return next(iter(self.policies.values())).job_shape(job_info)
+
+    def refresh(self):
+        for policy in self.policies.values():
+            policy.refresh()
+
+    def acquire(self, job_info: dict):
+        for policy in self.policies.values():
+            gpu_ids = policy.acquire(job_info)
+            if gpu_ids is not None:
+                return gpu_ids
+        return None
+
+    def release(self, job_info: dict, gpu_ids: list):
+        if gpu_ids:
+            self.policies[gpu_ids[0].split("/", 1)[0]].release(job_info, gpu_ids)
+
+
+class AgentSession:
+    def __init__(self, name: str, sock: socket.socket):
+        self.name = name
+        self.sock = sock
+        self.lock = threading.Lock()
+        self.pulls = 0
+        self.closed = False
+        self.delivered = set()
+
+
+class Coordinator(socketserver.ThreadingTCPServer):
+    """持有任务队列的协调器，各个主机上的agent连接后注册自己的GPU，并从这里拉取分配给它们的任务。"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, num_agents: int):
+        super().__init__(address, AgentHandler)
+        self.num_agents = num_agents
+        self.cond = threading.Condition()
+        self.gpu_infos = {}  # host -> gpu_infos
+        self.sessions = {}  # host -> AgentSession
+        self.assignments = {}  # host -> deque，agent断开期间分配给它的任务会一直保留
+        self.notify = None
+        self.stopping = False
+
+    def wait_for_agents(self):
+        with self.cond:
+            self.cond.wait_for(lambda: len(self.gpu_infos) >= self.num_agents)
+            return [x for infos in self.gpu_infos.values() for x in infos]
+
+    def register(self, session: AgentSession, gpu_infos: list):
+        with self.cond:
+            if session.name not in self.gpu_infos:
+                self.gpu_infos[session.name] = [dict(x, id=to_global_id(session.name, x["id"])) for x in gpu_infos]
+                self.assignments[session.name] = deque()
+            self.sessions[session.name] = session
+            self.cond.notify_all()
+        logger.info(f"Agent {session.name} registered with {gpu_infos}.")
+
+    def unregister(self, session: AgentSession):
+        with self.cond:
+            session.closed = True
+            if self.sessions.get(session.name) is session:
+                del self.sessions[session.name]
+            self.cond.notify_all()
+            delivered = list(session.delivered)
+        if not self.stopping:
+            logger.warning(f"Agent {session.name} disconnected.")
+        for job_id in delivered:
+            self.notify(job_id, None, f"Agent {session.name} disconnected.")
+
+    def assign(self, host: str, message: dict):
+        with self.cond:
+            self.assignments[host].append(message)
+            self.cond.notify_all()
+
+    def pull(self, session: AgentSession):
+        with self.cond:
+            session.pulls += 1
+            self.cond.notify_all()
+
+    def dispatch(self, session: AgentSession):
+        # 有未满足的pull请求时，将分配给该agent的任务发送出去
+        assignments = self.assignments[session.name]
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: session.closed or (session.pulls and assignments))
+                if session.closed:
+                    return
+                message = assignments.popleft()
+                session.pulls -= 1
+                session.delivered.add(message["job_id"])
+            try:
+                send_message(session.sock, message, session.lock)
+            except OSError:
+                with self.cond:
+                    session.delivered.discard(message["job_id"])
+                    assignments.appendleft(message)
+                return
+
+    def stop_agents(self):
+        with self.cond:
+            self.stopping = True
+            sessions = list(self.sessions.values())
+        for session in sessions:
+            try:
+                send_message(session.sock, {"op": "stop"}, session.lock)
+            except OSError:
+                pass
+
+
+class AgentHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        coordinator: Coordinator = self.server
+        message = json.loads(self.rfile.readline())
+        assert message["op"] == "register", message
+        session = AgentSession(message["name"], self.request)
+        coordinator.register(session, message["gpus"])
+
+        dispatcher = threading.Thread(target=coordinator.dispatch, args=(session,), daemon=True)
+        dispatcher.start()
+        try:
+            for line in self.rfile:
+                message = json.loads(line)
+                if message["op"] == "pull":
+                    coordinator.pull(session)
+                elif message["op"] == "done":
+                    with coordinator.cond:
+                        session.delivered.discard(message["job_id"])
+                    coordinator.notify(message["job_id"], message["returncode"], message["error"])
+        except (OSError, ValueError) as e:
+            logger.error(f"Lost connection with agent {session.name}: {e}")
+        finally:
+            coordinator.unregister(session)
+            dispatcher.join()
+
+
+class RemoteLauncher(Launcher):
+    """将任务交给GPU所在主机的agent执行。"""
+
+    def __init__(self, notify, coordinator: Coordinator):
+        super().__init__(notify)
+        self.coordinator = coordinator
+        coordinator.notify = self.on_done
+        self.lock = threading.Lock()
+        self.hosts = {}  # job_id -> host
+        self.loads = {host: 0 for host in coordinator.gpu_infos}
+
+    def on_done(self, job_id: int, returncode, error=None):
+        with self.lock:
+            host = self.hosts.pop(job_id, None)
+            if host is None:
+                return
+            self.loads[host] -= 1
+        self.notify(job_id, returncode, error)
+
+    def launch(self, job, gpu_ids: list):
+        with self.lock:
+            if gpu_ids:
+                host = gpu_ids[0].split("/", 1)[0]
+            else:
+                # 不需要GPU的任务交给当前任务最少的主机
+                host = min(self.loads, key=self.loads.get)
+            self.loads[host] += 1
+            self.hosts[job.job_id] = host
+        message = {"op": "run", "job_id": job.job_id, "info": job.info, "gpu_ids": [to_local_id(x) for x in gpu_ids]}
+        self.coordinator.assign(host, message)
+
+    def close(self):
+        self.coordinator.stop_agents()
+
+    def terminate(self):
+        self.coordinator.stop_agents()
+
+
+class ClusterScheduler(Scheduler):
+    def __init__(self, *args, coordinator: Coordinator, **kwargs):
+        self.coordinator = coordinator
+        super().__init__(*args, **kwargs)
+
+    def create_launcher(self, name: str):
+        return RemoteLauncher(self.notify, self.coordinator)
+
+
+def run_agent(address: tuple, name: str, gpu_infos: list):
+    sock = socket.create_connection(address)
+    lock = threading.Lock()
+    send_message(sock, {"op": "register", "name": name, "gpus": gpu_infos})
+
+    def notify(job_id, returncode, error=None):
+        logger.info(f"[Job-{job_id}] Exited with code {returncode}.")
+        send_message(sock, {"op": "done", "job_id": job_id, "returncode": returncode, "error": error}, lock)
+
+    launcher = AsyncLauncher(notify)
+    launcher.start()
+    try:
+        send_message(sock, {"op": "pull"}, lock)
+        for line in sock.makefile("r", encoding="utf-8"):
+            message = json.loads(line)
+            if message["op"] == "stop":
+                break
+            job = Job(message["job_id"], message["info"])
+            logger.info(f"[GPU-{','.join(message['gpu_ids'])}:Job-{job.name}] Executing `{job.info['command']}`...")
+            launcher.launch(job, message["gpu_ids"])
+            send_message(sock, {"op": "pull"}, lock)
+        launcher.close()
+    except KeyboardInterrupt:
+        launcher.terminate()
+    finally:
+        sock.close()
+
+
+def get_gpu_infos(args):
+    if args.fake_gpus is not None:
+        return [{"id": idx, "memory": args.fake_memory} for idx in range(args.fake_gpus)]
+
+    from .monitor import GPUMonitor
+
+    gpu_monitor = GPUMonitor(available_gpu_ids=args.gpus)
+    logger.info(gpu_monitor)
+    gpu_infos = [
+        {"id": idx, "memory": gpu_monitor.get_total_mem_by_id(idx), "labels": gpu_monitor.get_labels_by_id(idx)}
+        for idx in args.gpus
+    ]
+    gpu_monitor.shutdown()
+    return gpu_infos
+
+
+def main():
+    setup_logger()
+    # fmt: off
+    parser = argparse.ArgumentParser(description="Schedule jobs across several machines with a coordinator and one agent per machine.")
+    parser.add_argument("role", choices=["coordinator", "agent"])
+    parser.add_argument("--address", type=str, default="127.0.0.1:8765", help="The address the coordinator listens on or the agent connects to.")
+    parser.add_argument("--num-agents", type=int, default=1, help="[coordinator] The number of agents to wait for before scheduling.")
+    parser.add_argument("--policy", type=str, default="exclusive", choices=list(POLICIES), help="[coordinator] The resource policy used on each machine.")
+    parser.add_argument("--name", type=str, default=socket.gethostname(), help="[agent] The unique name of this machine.")
+    parser.add_argument("--gpus", type=int, nargs="+", default=[0], help="[agent] The ids of the GPUs to offer.")
+    parser.add_argument("--fake-gpus", type=int, help="[agent] Offer this many fake GPUs without detecting them by NVML.")
+    parser.add_argument("--fake-memory", type=int, default=24576, help="[agent] The memory (MB) of each fake GPU.")
+    # fmt: on
+    args, rest = parser.parse_known_args()
+    host, port = args.address.rsplit(":", 1)
+
+    if args.role == "agent":
+        run_agent((host, int(port)), args.name, get_gpu_infos(args))
+        return
+
+    scheduler_args = get_args(argv=rest)
+    config = load_config(scheduler_args.config)
+    with Coordinator((host, int(port)), num_agents=args.num_agents) as coordinator:
+        threading.Thread(target=coordinator.serve_forever, daemon=True).start()
+        logger.info(f"Waiting for {args.num_agents} agents on {args.address}...")
+        logger.info("The output of each job is printed by the agent that runs it.")
+        config["gpu"] = coordinator.wait_for_agents()
+        run(
+            MultiHostPolicy(POLICIES[args.policy]),
+            args=scheduler_args,
+            config=config,
+            scheduler_cls=ClusterScheduler,
+            # 各个主机的CPU和内存不在协调器上，暂不管理
+            host_resources=False,
+            # 任务的输出由执行它的agent打印，协调器上没有任务的日志
+            job_logs=False,
+            coordinator=coordinator,
+        )
+        coordinator.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+# @GitHub  : https://github.com/lartpang
+
+import argparse
+import json
+import os
+import socket
+import socketserver
+import sys
+
+import yaml
+
+
+def remove_stale_socket(path: str):
+    # 上一次运行残留的socket文件可以删除，但不能抢占仍在运行的调度器的socket
+    if not os.path.exists(path):
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.remove(path)
+            return
+    raise RuntimeError(f"Another scheduler is already accepting jobs on {path}.")
+
+
+class ControlServer(socketserver.ThreadingUnixStreamServer):
+    """调度器的本地控制接口（Unix socket上的JSON Lines）。
+
+    每条请求形如 `{"op": ..., ...}`，在调度主线程中执行后返回 `{"ok": true, "result": ...}`
+    或 `{"ok": false, "error": ...}`。支持的操作：
+    - `submit`：`{"jobs": [job_info, ...]}`，返回新任务的ID；
+    - `cancel`：`{"job": ID或名字}`，等待中的任务直接取消，运行中的任务会收到SIGTERM；
+    - `priority`：`{"job": ID或名字, "priority": int}`；
+    - `list`：返回所有任务的状态；
+    - `shutdown`：不再接受新的任务，已有的任务全部结束后调度器退出。
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path: str, scheduler):
+        remove_stale_socket(path)
+        super().__init__(path, ControlHandler)
+        self.path = path
+        self.scheduler = scheduler
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def submit(self, job_infos: list):
+        if not self.scheduler.serving:
+            raise RuntimeError("The scheduler is shutting down.")
+        return [self.scheduler.submit(job_info) for job_info in job_infos]
+
+    def cancel(self, job: str):
+        jobs = self.scheduler.jobs.find(job)
+        for x in jobs:
+            self.scheduler.cancel(x)
+        return [x.job_id for x in jobs]
+
+    def set_priority(self, job: str, priority: int):
+        jobs = self.scheduler.jobs.find(job)
+        for x in jobs:
+            self.scheduler.set_priority(x, priority)
+        return [x.job_id for x in jobs]
+
+    def list_jobs(self):
+        return [
+            {
+                "id": job.job_id,
+                "name": job.name,
+                "status": job.status.name,
+                "priority": job.priority,
+                "gpu_ids": job.gpu_ids,
+                "attempts": job.attempts,
+                "command": job.info["command"],
+            }
+            for job in self.scheduler.jobs
+        ]
+
+    def execute(self, message: dict):
+        op = message["op"]
+        if op == "submit":
+            return self.scheduler.call(self.submit, message["jobs"])
+        if op == "cancel":
+            return self.scheduler.call(self.cancel, message["job"])
+        if op == "priority":
+            return self.scheduler.call(self.set_priority, message["job"], int(message["priority"]))
+        if op == "list":
+            return self.scheduler.call(self.list_jobs)
+        if op == "shutdown":
+            return self.scheduler.call(self.scheduler.shutdown)
+        raise ValueError(f"Unknown operation: {op}")
+
+
+class ControlHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                reply = {"ok": True, "result": self.server.execute(json.loads(line))}
+            except Exception as e:
+                reply = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+            self.wfile.write((json.dumps(reply, ensure_ascii=False) + "\n").encode("utf-8"))
+
+
+def request(path: str, message: dict):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        sock.sendall((json.dumps(message) + "\n").encode("utf-8"))
+        reply = json.loads(sock.makefile("r", encoding="utf-8").readline())
+    if not reply["ok"]:
+        raise RuntimeError(reply["error"])
+    return reply["result"]
+
+
+def main():
+    # fmt: off
+    parser = argparse.ArgumentParser(description="Control a scheduler started with `--daemon`.")
+    parser.add_argument("--socket", type=str, required=True, help="The control socket of the scheduler, `<config>.sock` by default.")
+    subparsers = parser.add_subparsers(dest="op", required=True)
+    submit_parser = subparsers.add_parser("submit", help="Submit jobs from a yaml or from the command line.")
+    submit_parser.add_argument("--config", type=str, help="A yaml with a `job` list in the same format as the config.")
+    submit_parser.add_argument("--command", type=str, help="The command of a single job.")
+    submit_parser.add_argument("--name", type=str, help="The name of the single job.")
+    submit_parser.add_argument("--num-gpus", type=int, default=1, help="The number of GPUs of the single job.")
+    submit_parser.add_argument("--memory", type=int, help="The memory (MB) on each GPU of the single job.")
+    submit_parser.add_argument("--priority", type=int, default=0, help="The priority of the single job.")
+    cancel_parser = subparsers.add_parser("cancel", help="Cancel jobs by id or name.")
+    cancel_parser.add_argument("jobs", type=str, nargs="+")
+    priority_parser = subparsers.add_parser("priority", help="Change the priority of a job by id or name.")
+    priority_parser.add_argument("job", type=str)
+    priority_parser.add_argument("priority", type=int)
+    subparsers.add_parser("list", help="Show the status of all jobs.")
+    subparsers.add_parser("shutdown", help="Exit once all jobs have finished.")
+    # fmt: on
+    args = parser.parse_args()
+
+    try:
+        if args.op == "submit":
+            if args.config is not None:
+                with open(args.config, mode="r", encoding="utf-8") as f:
+                    job_infos = yaml.safe_load(f)["job"]
+            elif args.command is not None:
+                job_info = {"command": args.command, "num_gpus": args.num_gpus, "priority": args.priority}
+                if args.name is not None:
+                    job_info["name"] = args.name
+                if args.memory is not None:
+                    job_info["memory"] = args.memory
+                job_infos = [job_info]
+            else:
+                parser.error("submit requires `--config` or `--command`.")
+            print("Submitted jobs:", *request(args.socket, {"op": "submit", "jobs": job_infos}))
+        elif args.op == "cancel":
+            for job in args.jobs:
+                print("Cancelled jobs:", *request(args.socket, {"op": "cancel", "job": job}))
+        elif args.op == "priority":
+            request(args.socket, {"op": "priority", "job": args.job, "priority": args.priority})
+        elif args.op == "list":
+            print(f"{'ID':>5}  {'Name':<20}{'Status':<11}{'Priority':>9}  {'GPUs':<10}Command")
+            for job in request(args.socket, {"op": "list"}):
+                gpu_ids = ",".join(job["gpu_ids"] or [])
+                print(
+                    f"{job['id']:>5}  {str(job['name']):<20}{job['status']:<11}{job['priority']:>9}  "
+                    f"{gpu_ids:<10}{job['command']}"
+                )
+        elif args.op == "shutdown":
+            request(args.socket, {"op": "shutdown"})
+    except (OSError, RuntimeError) as e:
+        sys.exit(f"Error: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,741 @@
+# -*- coding: utf-8 -*-
+# @GitHub  : https://github.com/lartpang
+
+import argparse
+import concurrent.futures
+import logging
+import os
+import queue
+import signal
+import threading
+import time
+
+import yaml
+
+from .jobs import FINISHED_STATUSES, STATUS, Job, JobTable
+from .journal import Journal
+from .cache import ResultCache
+from .host import HostResourcePolicy
+from .logs import JobLogger
+from .metrics import MetricsRecorder
+from .profile import ProfileRecorder, ProfileStore
+from .launcher import LAUNCHERS, build_launcher
+from .policy import dominates
+from .watchdog import FakeUtilization, Watchdog
+
+logger = logging.getLogger("runit")
+
+
+def setup_logger():
+    if logger.handlers:
+        return
+    logger.setLevel(logging.INFO)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter("[%(name)s %(levelname)s] %(message)s"))
+    logger.addHandler(stream_handler)
+
+
+class Scheduler:
+    """事件驱动的调度核心。
+
+    所有状态（任务状态表、GPU资源）都只存在于调度主进程中，由launcher在任务结束时通过事件队列唤醒主循环，
+    随后在主线程中释放资源并立即进行下一轮调度。`interval_for_loop` 仅作为兜底的最长等待时间。
+
+    配置中 `backfill: true` 时使用EASY backfilling：队首放不下的任务获得一个预留（预计可以启动的时刻），
+    之后的任务只有在不推迟该预留时才能插空运行。
+
+    任务以退出码判断成败，失败的任务最多重试 `max_retries` 次（每次的等待时间指数增长），之后进入最终的FAILED状态。
+
+    `preemptible: true` 的任务可以被抢占：优先级更高的任务放不下时，调度器向优先级更低的可抢占任务发送
+    `preempt_signal`（默认SIGTERM，如约定SIGUSR1为“保存checkpoint后退出”），超过 `preempt_grace` 秒仍未退出则发送SIGKILL。
+    被抢占的任务退出后释放资源并重新排队（不计入重试次数），其间更低优先级的任务不会被调度。
+
+    设置了 `timeout`（秒）的任务运行超时后会收到SIGTERM，`kill_grace` 秒后仍未退出则发送SIGKILL，并按失败处理；
+    `watchdog.Watchdog` 发现GPU长时间空闲的任务时同样如此。信号总是发给任务的整个进程组。
+
+    提供 `cache`（`cache.ResultCache`）时，与之前某次成功运行完全相同的任务不会被启动，直接成为DONE。
+
+    `daemon` 为真时，所有任务完成后调度器仍继续运行，直到 `shutdown` 被调用；
+    其他线程（如 `control.ControlServer`）通过 `call` 在主线程中提交、取消任务或调整优先级。
+    """
+
+    def __init__(
+        self,
+        policy,
+        gpu_infos: list,
+        job_infos: list,
+        max_workers: int = None,
+        interval_for_loop=1,
+        launcher: str = "async",
+        config: dict = None,
+        max_retries: int = 0,
+        retry_backoff: float = 5,
+        hooks: list = None,
+        job_logger=None,
+        daemon: bool = False,
+        cache=None,
+    ):
+        self.policy = policy
+        self.gpu_infos = gpu_infos
+        if max_workers is None:
+            # 只有进程池需要限制worker的数量，其他launcher同时运行的任务数只受资源的限制
+            max_workers = len(gpu_infos) if launcher == "pool" else float("inf")
+        self.max_workers = max_workers
+        self.interval_for_loop = interval_for_loop
+        self.backfill = bool((config or {}).get("backfill", False))
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.serving = daemon
+        self.stopping = {}  # job_id -> [原因（cancel、preempt、timeout或idle）, 发送SIGKILL的时刻]
+        self.timeouts = {}  # job_id -> 运行超时的时刻
+        self.kill_grace = (config or {}).get("kill_grace", 10)
+        self.preempt_signal = (config or {}).get("preempt_signal", "SIGTERM")
+        self.preempt_grace = (config or {}).get("preempt_grace", 30)
+        self.sweep_lookahead = (config or {}).get("sweep_lookahead", 100)
+        self.cache = cache
+
+        self.policy.setup(gpu_infos, config or {})
+        self.jobs = JobTable(job_infos)
+        # 其他线程（launcher、hook的后台线程）通过事件队列让主线程执行操作
+        self.events = queue.Queue()
+
+        # hook需要实现 attach(scheduler)、on_submit(job)、on_status(job) 和 close()，
+        # attach和on_submit可以在检查之前补全任务信息
+        self.hooks = hooks or []
+        for hook in self.hooks:
+            hook.attach(self)
+
+        for job in self.jobs:
+            self.check(job)
+        # 配置中的任务可以依赖排在它后面的任务，全部加入后再建立依赖关系
+        for job in list(self.jobs):
+            self.link_dependencies(job)
+        self.jobs.check_cycles()
+        for sweep in self.jobs.sweeps:
+            logger.info(f"Sweep {sweep.name}: {len(sweep)} jobs.")
+            self.expand_sweep(sweep)
+
+        self.job_logger = job_logger
+        self.launcher = self.create_launcher(launcher)
+
+    def create_launcher(self, name: str):
+        return build_launcher(name, self.notify, max_workers=self.max_workers, job_logger=self.job_logger)
+
+    def now(self):
+        return time.monotonic()
+
+    def set_status(self, job, status):
+        self.jobs.set_status(job, status)
+        for hook in self.hooks:
+            hook.on_status(job)
+        # sweep中的任务第一次离开等待队列时，生成该sweep的下一个任务补上它的位置
+        if (
+            job.sweep is not None
+            and job.job_id in job.sweep.pending
+            and status not in (STATUS.WAITING, STATUS.BLOCKED)
+        ):
+            job.sweep.pending.discard(job.job_id)
+            self.expand_sweep(job.sweep, len(job.sweep.pending) + 1)
+        if status in FINISHED_STATUSES:
+            self.release_children(job)
+
+    def check(self, job):
+        # sweep中的任务由同一个模板生成，对模板的警告只在其第一个任务上输出
+        warn = job.sweep is None or job.job_id == job.sweep.first_id
+        self.policy.check(job.job_id, job.info, warn)
+        if job.preemptible:
+            self.get_preempt_signal(job)
+
+    def get_preempt_signal(self, job):
+        name = job.info.get("preempt_signal", self.preempt_signal)
+        try:
+            signum = signal.Signals[name] if isinstance(name, str) else signal.Signals(name)
+        except (KeyError, ValueError):
+            raise ValueError(f"Unknown preempt_signal {name} of job {job.name}.")
+        if signum in (signal.SIGSTOP, signal.SIGTSTP):
+            # 暂停的进程仍然占用着显存，无法真正地将资源让给其他任务
+            raise ValueError(f"The preempt_signal of job {job.name} should make it exit, not {signum.name}.")
+        return signum
+
+    def link_dependencies(self, job):
+        if not job.depends_on or job.status is not STATUS.WAITING:
+            return
+        parents = [x for ref in job.depends_on for x in self.find_jobs(job, ref) if x is not job]
+        unfinished = [x for x in parents if x.status is not STATUS.DONE]
+        for parent in unfinished:
+            if parent.status in FINISHED_STATUSES:
+                # 上游任务已经失败或被取消
+                self.set_status(job, parent.status)
+                return
+        for parent in unfinished:
+            self.jobs.add_dependency(parent, job)
+        if unfinished:
+            self.set_status(job, STATUS.BLOCKED)
+
+    def find_jobs(self, job, ref):
+        # 被依赖的可能是sweep中还没有生成的任务，先生成到该任务为止，依赖关系才能立即建立
+        for sweep in self.jobs.sweeps:
+            index = sweep.find(ref)
+            if index is not None and index >= sweep.next_index:
+                self.expand_sweep(sweep, until=index)
+        try:
+            return self.jobs.find(ref)
+        except KeyError:
+            raise ValueError(f"Job {job.name} depends on an unknown job {ref}.")
+
+    def release_children(self, job):
+        # 上游任务成功时解除下游任务的阻塞，否则下游任务（及其后代）以相同的状态结束
+        for child_id in self.jobs.children.pop(job.job_id, []):
+            child = self.jobs[child_id]
+            if child.status is not STATUS.BLOCKED:
+                continue
+            if job.status is STATUS.DONE:
+                child.num_blocking -= 1
+                if child.num_blocking == 0:
+                    self.set_status(child, STATUS.WAITING)
+            else:
+                logger.warning(f"Cancel job {child.name}, its dependency {job.name} is {job.status.name}.")
+                self.set_status(child, job.status)
+
+    def notify(self, job_id: int, returncode, error=None):
+        # 可能在launcher的线程中被调用，只负责投递事件，并记下任务结束的时刻
+        self.events.put((self.on_finish, (job_id, returncode, error, self.now())))
+
+    def call(self, func, *args):
+        # 在其他线程中调用，func由主线程执行，返回其结果或抛出其异常
+        future = concurrent.futures.Future()
+
+        def run_func():
+            try:
+                future.set_result(func(*args))
+            except Exception as e:
+                future.set_exception(e)
+
+        self.events.put((run_func, ()))
+        return future.result()
+
+    def add_job(self, job_id: int, job_info: dict, sweep=None):
+        job = Job(job_id, job_info)
+        job.sweep = sweep
+        self.jobs.add(job)
+        for hook in self.hooks:
+            hook.on_submit(job)
+        try:
+            self.check(job)
+            self.link_dependencies(job)
+        except Exception as e:
+            logger.error(f"Reject job {job.name}: {e}")
+            self.set_status(job, STATUS.FAILED)
+            raise
+        return job
+
+    def expand_sweep(self, sweep, num_pending=1, until=-1):
+        # 每个sweep只保留num_pending个还没有启动过的任务，其后的任务在它们启动（或被取消）后才生成，
+        # 因此同一轮调度中可以连续启动同一个sweep中的多个任务，而内存和启动时间与sweep的大小无关；
+        # 被其他任务依赖时，至少生成到第until个任务
+        while len(sweep.pending) < num_pending or sweep.next_index <= until:
+            item = sweep.pop()
+            if item is None:
+                return
+            try:
+                job = self.add_job(*item, sweep=sweep)
+            except Exception:
+                continue
+            # 恢复时已经完成的任务不需要启动
+            if job.status in (STATUS.WAITING, STATUS.BLOCKED):
+                sweep.pending.add(job.job_id)
+
+    def skip_sweep_job(self, job):
+        # sweep中还没有启动过的任务在本轮放不下时，再生成其后的一个任务，使后面较小的任务不被它挡住；
+        # 这样的任务数不超过空闲的worker数和 `sweep_lookahead`
+        sweep = job.sweep
+        if sweep is None or job.job_id not in sweep.pending:
+            return
+        limit = min(self.max_workers - len(self.jobs.running), self.sweep_lookahead)
+        if len(sweep.pending) < limit:
+            self.expand_sweep(sweep, len(sweep.pending) + 1)
+
+    def submit(self, job_info: dict):
+        for key in ("command", "num_gpus"):
+            if key not in job_info:
+                raise ValueError(f"The job {job_info} does not have `{key}`.")
+        if "sweep" in job_info:
+            sweep = self.jobs.add_sweep(job_info)
+            logger.info(f"Submit sweep {sweep.name} (id {sweep.first_id}-{len(self.jobs) - 1}): {len(sweep)} jobs.")
+            self.expand_sweep(sweep)
+            return sweep.first_id
+        job = self.add_job(len(self.jobs), job_info)
+        logger.info(f"Submit job {job.name} (id {job.job_id}): `{job.info['command']}`.")
+        return job.job_id
+
+    def cancel(self, job):
+        if job.status in FINISHED_STATUSES:
+            raise ValueError(f"Job {job.name} has already finished ({job.status.name}).")
+        if job.status is STATUS.RUNNING:
+            # 任务退出后在on_finish中标记为CANCELLED
+            if not self.stop(job, "cancel"):
+                raise ValueError(f"The launcher cannot stop the running job {job.name}.")
+        else:
+            self.set_status(job, STATUS.CANCELLED)
+        logger.warning(f"Cancel job {job.name}.")
+
+    def stop(self, job, reason: str, signum=signal.SIGTERM, grace=None):
+        # 向运行中的任务发送signum，grace秒后仍未退出则发送SIGKILL，返回是否成功
+        if job.job_id in self.stopping:
+            if reason == "cancel":
+                # 正在停止的任务（如被抢占）又被取消，退出后不再重新排队
+                self.stopping[job.job_id][0] = reason
+            return True
+        if not self.launcher.send_signal(job.job_id, signum):
+            return False
+        grace = self.kill_grace if grace is None else grace
+        self.stopping[job.job_id] = [reason, self.now() + grace]
+        return True
+
+    def on_idle(self, job_id: int):
+        # 由watchdog投递，任务的GPU空闲时间已经超过了阈值
+        job = self.jobs[job_id]
+        if job.status is not STATUS.RUNNING or job_id in self.stopping:
+            return
+        logger.error(f"Job {job.name} has left its GPUs idle for too long, stop it.")
+        if not self.stop(job, "idle"):
+            logger.error(f"The launcher cannot stop the running job {job.name}.")
+
+    def check_deadlines(self):
+        now = self.now()
+        for job_id, deadline in list(self.timeouts.items()):
+            if deadline <= now:
+                del self.timeouts[job_id]
+                job = self.jobs[job_id]
+                logger.error(f"Job {job.name} has run for more than {job.timeout}s, stop it.")
+                if not self.stop(job, "timeout"):
+                    logger.error(f"The launcher cannot stop the running job {job.name}.")
+        # 宽限期结束后仍未退出的任务
+        for job_id, item in self.stopping.items():
+            if item[1] <= now:
+                logger.warning(f"Job {self.jobs[job_id].name} did not exit in time, kill it.")
+                self.launcher.send_signal(job_id, signal.SIGKILL)
+                item[1] = float("inf")
+
+    def set_priority(self, job, priority: int):
+        self.jobs.set_priority(job, priority)
+        logger.info(f"Set the priority of job {job.name} to {priority}.")
+
+    def shutdown(self):
+        # 不再等待新的任务，已有的任务全部结束后退出
+        self.serving = False
+
+    def on_failure(self, job, job_identifier: str):
+        job.attempts += 1
+        max_retries = self.max_retries if job.max_retries is None else job.max_retries
+        if job.attempts > max_retries:
+            logger.error(f"{job_identifier} Give up after {job.attempts} attempts.")
+            self.set_status(job, STATUS.FAILED)
+            return
+
+        # 指数退避：第n次重试前等待 retry_backoff * 2^(n-1) 秒
+        backoff = self.retry_backoff * 2 ** (job.attempts - 1)
+        job.ready_time = self.now() + backoff
+        logger.warning(f"{job_identifier} Retry {job.attempts}/{max_retries} in {backoff}s.")
+        self.set_status(job, STATUS.RETRYING)
+
+    def on_finish(self, job_id: int, returncode, error=None, end_time=None):
+        job = self.jobs[job_id]
+        if job.status is not STATUS.RUNNING:
+            # 重复的结束事件（如agent断开时），忽略
+            return
+        job.end_time = self.now() if end_time is None else end_time
+        job_identifier = f"[GPU-{','.join(job.gpu_ids)}:Job-{job.name}]"
+        reason, _ = self.stopping.pop(job_id, (None, None))
+        self.timeouts.pop(job_id, None)
+        if reason == "cancel":
+            logger.warning(f"{job_identifier} Cancelled.")
+            self.set_status(job, STATUS.CANCELLED)
+        elif reason == "preempt":
+            # 收到抢占信号后的退出码没有意义，一律重新排队
+            job.preemptions += 1
+            logger.warning(f"{job_identifier} Preempted ({job.preemptions} times), requeue it.")
+            self.set_status(job, STATUS.WAITING)
+        elif reason == "timeout":
+            logger.error(f"{job_identifier} Command `{job.info['command']}` was stopped after {job.timeout}s.")
+            self.on_failure(job, job_identifier)
+        elif reason == "idle":
+            logger.error(f"{job_identifier} Command `{job.info['command']}` was stopped with its GPUs idle.")
+            self.on_failure(job, job_identifier)
+        elif error is not None:
+            logger.error(f"{job_identifier} Command `{job.info['command']}` failed: {error}")
+            self.on_failure(job, job_identifier)
+        elif returncode != 0:
+            logger.error(f"{job_identifier} Command `{job.info['command']}` exited with code {returncode}.")
+            self.on_failure(job, job_identifier)
+        else:
+            self.set_status(job, STATUS.DONE)
+
+        # 释放GPU资源
+        self.policy.release(job.info, job.gpu_ids)
+        logger.info(f"{job_identifier} Release GPU {','.join(job.gpu_ids)}...")
+        job.gpu_ids = job.cpu_ids = None
+
+    def process_events(self):
+        # 处理所有已经到达的事件
+        while True:
+            try:
+                event = self.events.get_nowait()
+            except queue.Empty:
+                break
+            self.handle(event)
+
+    def get_timeout(self):
+        # 最多等到下一个重试任务的退避时间结束
+        timeout = self.interval_for_loop
+        next_ready_time = self.jobs.next_ready_time()
+        if next_ready_time is not None:
+            timeout = max(min(timeout, next_ready_time - self.now()), 0)
+        # 或者下一个任务超时、下一个正在停止的任务的宽限期结束
+        deadlines = list(self.timeouts.values()) + [kill_time for _, kill_time in self.stopping.values()]
+        if deadlines:
+            timeout = max(min(timeout, min(deadlines) - self.now()), 0)
+        return timeout
+
+    def handle(self, event):
+        func, args = event
+        func(*args)
+
+    def wait_for_events(self):
+        # 阻塞直到有任务结束或收到控制命令
+        try:
+            event = self.events.get(timeout=self.get_timeout())
+        except queue.Empty:
+            return
+        self.handle(event)
+        self.process_events()
+
+    def launch(self, job, gpu_ids: list):
+        job.gpu_ids = gpu_ids
+        job.cpu_ids = self.policy.get_cpu_ids(job.info)
+        job.start_time = self.now()
+        job.spawn_time = job.end_time = None
+        if job.timeout is not None:
+            self.timeouts[job.job_id] = job.start_time + job.timeout
+        self.set_status(job, STATUS.RUNNING)
+        logger.info(f"[GPU-{','.join(gpu_ids)}:Job-{job.name}] Executing `{job.info['command']}`...")
+        self.launcher.launch(job, gpu_ids)
+
+    def release_until(self, policy, end_time):
+        # 在policy的副本上按预计结束时间依次释放运行中的任务，直到end_time
+        now = self.now()
+        running = sorted((self.jobs[x] for x in self.jobs.running), key=lambda x: x.expected_end_time(now))
+        for job in running:
+            job_end_time = job.expected_end_time(now)
+            if job_end_time > end_time:
+                break
+            policy.release(job.info, job.gpu_ids)
+            yield job_end_time
+
+    def get_shadow_time(self, head):
+        # 队首任务最早可以启动的时刻，若即使所有任务都结束也放不下则返回None
+        probe = self.policy.clone()
+        for end_time in self.release_until(probe, float("inf")):
+            if probe.acquire(head.info) is not None:
+                return end_time
+        return None
+
+    def can_backfill(self, job, head, shadow_time):
+        # 调用时job已经在真实状态上获取了资源
+        if job.estimated_duration is not None and self.now() + job.estimated_duration <= shadow_time:
+            return True
+        # 会运行到预留时刻之后，则需要确认在预留时刻队首任务仍然放得下
+        probe = self.policy.clone()
+        for _ in self.release_until(probe, shadow_time):
+            pass
+        return probe.acquire(head.info) is not None
+
+    def find_victims(self, job):
+        """找出为了让job放得下还需要抢占的任务，无法通过抢占放下时返回None。
+
+        正在停止的任务视为即将释放资源；其余优先级低于job的可抢占任务中，
+        优先抢占优先级最低、启动最晚（损失的进度最少）的任务，直到job放得下为止，
+        再按相反的顺序去掉不抢占也放得下的任务（如与job需要的GPU无关的任务）。
+        """
+        if not self.launcher.can_signal:
+            return None
+        running = [self.jobs[x] for x in self.jobs.running]
+        candidates = [
+            x for x in running if x.preemptible and x.priority < job.priority and x.job_id not in self.stopping
+        ]
+        if not candidates and not self.stopping:
+            return None
+        candidates.sort(key=lambda x: (x.priority, -x.start_time))
+
+        stopping = [x for x in running if x.job_id in self.stopping]
+        probe = self.get_probe(stopping)
+        victims = []
+        for victim in [None] + candidates:
+            if victim is not None:
+                probe.release(victim.info, victim.gpu_ids)
+                victims.append(victim)
+            if probe.acquire(job.info) is not None:
+                break
+        else:
+            return None
+        for victim in reversed(victims[:-1]):
+            others = [x for x in victims if x is not victim]
+            if self.get_probe(stopping + others).acquire(job.info) is not None:
+                victims = others
+        return victims
+
+    def get_probe(self, released: list):
+        # 释放了released中的任务后的资源状态，只用于试探，不影响真实的分配
+        probe = self.policy.clone()
+        for x in released:
+            probe.release(x.info, x.gpu_ids)
+        return probe
+
+    def preempt(self, job, victims: list):
+        for victim in victims:
+            signum = self.get_preempt_signal(victim)
+            grace = victim.info.get("preempt_grace", self.preempt_grace)
+            if not self.stop(victim, "preempt", signum, grace):
+                # 任务恰好已经退出
+                continue
+            logger.warning(f"Preempt job {victim.name} with {signum.name} for job {job.name}.")
+
+    def schedule(self):
+        self.policy.refresh()
+        skipped = []
+        failed_shapes = []
+        reservation = None
+        for job in self.jobs.iter_waiting():
+            if self.cache is not None and not self.cache.is_ready(job):
+                # 输入的摘要在后台计算，完成后调度器会被唤醒
+                skipped.append(job)
+                continue
+            record = None if self.cache is None else self.cache.lookup(job)
+            if record is not None:
+                logger.info(f"Skip job {job.name}, the same run succeeded at {record['time']}.")
+                self.set_status(job, STATUS.DONE)
+                continue
+
+            if len(self.jobs.running) >= self.max_workers:
+                skipped.append(job)
+                break
+
+            # 同一轮中，比已经放不下的任务需求更大的任务也一定放不下
+            shape = self.policy.job_shape(job.info)
+            if any(dominates(shape, x) for x in failed_shapes):
+                skipped.append(job)
+                self.skip_sweep_job(job)
+                continue
+
+            gpu_ids = self.policy.acquire(job.info)
+            if gpu_ids is None:
+                # 如果GPU资源不足，跳过当前指令，等待资源释放后再重试
+                failed_shapes.append(shape)
+                skipped.append(job)
+                # 与预留相同，只为第一个放不下的任务抢占
+                victims = self.find_victims(job) if len(failed_shapes) == 1 else None
+                if victims is not None:
+                    # 抢占（或等待已经在进行的抢占）腾出资源，在此之前不再启动优先级更低的任务
+                    self.preempt(job, victims)
+                    break
+                if self.backfill and reservation is None:
+                    shadow_time = self.get_shadow_time(job)
+                    if shadow_time is not None:
+                        reservation = (job, shadow_time)
+                        logger.debug(f"Reserve resources for {job} at {shadow_time}.")
+                self.skip_sweep_job(job)
+                continue
+
+            if reservation is not None and not self.can_backfill(job, *reservation):
+                # 会推迟队首任务的预留，放弃本次调度
+                self.policy.release(job.info, gpu_ids)
+                skipped.append(job)
+                self.skip_sweep_job(job)
+                continue
+            self.launch(job, gpu_ids)
+
+        for job in skipped:
+            self.jobs.push_waiting(job)
+
+    def run(self):
+        self.launcher.start()
+        try:
+            # 循环处理指令，直到所有指令都被处理
+            while self.serving or not self.jobs.all_finished():
+                self.jobs.wake_retrying(self.now())
+                self.check_deadlines()
+                self.schedule()
+                self.wait_for_events()
+            self.launcher.close()
+        except KeyboardInterrupt:
+            logger.error("[CAUGHT KEYBOARDINTERRUPT, TERMINATING WORKERS!]")
+            self.launcher.terminate()
+            return
+        finally:
+            for hook in self.hooks:
+                hook.close()
+        logger.info("[ALL COMMANDS HAVE BEEN COMPLETED!]")
+
+        failed_jobs = [job for job in self.jobs if job.status is STATUS.FAILED]
+        if failed_jobs:
+            logger.error("[FAILED JOBS]\n -" + "\n -".join([str(job.info) for job in failed_jobs]))
+
+
+def get_args(add_arguments=None, argv=None):
+    # fmt: off
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", type=str, required=True, help="The path of the yaml containing all information of gpus and cmds.")
+    parser.add_argument("--max-workers", type=int, help="The max number of the running jobs, the number of GPUs by default for `--launcher pool` and unlimited otherwise.")
+    parser.add_argument("--interval-for-waiting-gpu", type=int, default=3, help="Deprecated, the scheduler is woken up as soon as a job releases its GPUs.")
+    parser.add_argument("--interval-for-loop", type=int, default=1, help="In seconds, the max interval for waiting for a job to finish before rechecking.")
+    parser.add_argument("--max-retries", type=int, default=0, help="The max number of retries of a failed job, can be overridden by `max_retries` of each job.")
+    parser.add_argument("--retry-backoff", type=float, default=5, help="In seconds, the waiting time before the first retry, doubled for each following retry.")
+    parser.add_argument("--journal", type=str, help="The path of the job journal, `<config>.journal.jsonl` by default.")
+    parser.add_argument("--resume", action="store_true", help="Skip the jobs completed in the journal and requeue the others.")
+    parser.add_argument("--profile-store", type=str, help="The path of the json recording the resource usage of each command, e.g. `~/.cache/runit/profiles.json`. Disabled by default.")
+    parser.add_argument("--profile-percentile", type=float, default=95, help="The percentile of the recorded usage used to fill `memory` and `estimated_duration`.")
+    parser.add_argument("--profile-tighten", action="store_true", help="Also lower the declared `memory` of a job to the recorded usage.")
+    parser.add_argument("--log-dir", type=str, help="The directory of the output of each job, `<config>.logs` by default.")
+    parser.add_argument("--log-max-mb", type=float, default=100, help="The max size (MB) of a log file before it is rotated.")
+    parser.add_argument("--log-backups", type=int, default=3, help="The number of rotated log files kept for each job.")
+    parser.add_argument("--log-compress", action="store_true", help="Compress the logs of a job with gzip when it exits.")
+    parser.add_argument("--inherit-output", action="store_true", help="Print the output of all jobs to the terminal of the scheduler instead of their log files.")
+    parser.add_argument("--metrics-dir", type=str, help="The directory of the metrics of the scheduler (Prometheus text, JSON summary and Chrome trace). Disabled by default.")
+    parser.add_argument("--cache-dir", type=str, help="The directory of the result cache, e.g. `~/.cache/runit/results`; a job declaring `outputs` is skipped if the same command with the same `env` and `inputs` has succeeded and its outputs are intact. Disabled by default.")
+    parser.add_argument("--idle-window", type=float, help="In seconds, report the jobs whose GPUs have been idle for this long (see `--idle-action`). Disabled by default.")
+    parser.add_argument("--idle-threshold", type=float, default=5, help="The GPU utilization (%%) at or below which a GPU counts as idle.")
+    parser.add_argument("--idle-action", type=str, default="warn", choices=("warn", "kill"), help="`warn`: only log the idle jobs; `kill`: stop them and treat them as failed.")
+    parser.add_argument("--fake-utilization", type=str, help="For testing, read the GPU utilization from a json like `{\"0\": 95}` instead of NVML.")
+    parser.add_argument("--daemon", action="store_true", help="Keep running after all jobs have finished, and accept new jobs from the control socket (see `python -m runit.control`).")
+    parser.add_argument("--control-socket", type=str, help="The path of the control socket of `--daemon`, `<config>.sock` by default.")
+    parser.add_argument("--launcher", type=str, default="async", choices=LAUNCHERS, help="`async`: supervise all jobs in one asyncio loop; `local`: supervise each job in a thread of the scheduler process; `pool`: wait for each job in a process pool.")
+    # fmt: on
+    if add_arguments is not None:
+        add_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def load_config(path: str):
+    with open(path, mode="r", encoding="utf-8") as f:
+        config = yaml.safe_load(f)
+
+    # 集群模式下GPU的信息由各个agent提供
+    gpu_infos: list = config.setdefault("gpu", [])
+    # 守护模式下任务可以全部在运行期间提交
+    job_infos: list = config.setdefault("job", [])
+    assert isinstance(gpu_infos, (tuple, list)), gpu_infos
+    assert isinstance(job_infos, (tuple, list)), job_infos
+    return config
+
+
+def run(
+    policy,
+    args=None,
+    config=None,
+    hooks=None,
+    memory_sampler=None,
+    scheduler_cls=Scheduler,
+    host_resources=True,
+    job_logs=True,
+    utilization_source=None,
+    **kwargs,
+):
+    setup_logger()
+    if args is None:
+        args = get_args()
+    logger.info("[YOUR CONFIG]\n" + str(args))
+
+    if config is None:
+        config = load_config(args.config)
+    gpu_infos, job_infos = config["gpu"], config["job"]
+    # 同时按任务的 `cpus` 和 `host_memory` 管理本机的CPU和内存；守护模式下之后提交的任务也可能用到
+    uses_host = "host" in config or any("cpus" in x or "host_memory" in x for x in job_infos)
+    if host_resources and (uses_host or args.daemon):
+        policy = HostResourcePolicy(policy)
+    logger.info("[YOUR GPUS]\n -" + "\n -".join([str(x) for x in gpu_infos]))
+    logger.info("[YOUR CMDS]\n -" + "\n -".join([str(x) for x in job_infos]))
+
+    socket_path = args.control_socket or os.path.splitext(args.config)[0] + ".sock"
+    if args.daemon:
+        from .control import remove_stale_socket
+
+        # 同一个配置的另一个守护进程仍在运行时，在写入日志之前退出
+        remove_stale_socket(socket_path)
+
+    journal_path = args.journal or os.path.splitext(args.config)[0] + ".journal.jsonl"
+    journal = Journal(journal_path, resume=args.resume)
+    hooks = [journal] + list(hooks or [])
+    if args.profile_store:
+        profile_recorder = ProfileRecorder(
+            ProfileStore(args.profile_store),
+            memory_sampler=memory_sampler,
+            percentile=args.profile_percentile,
+            tighten=args.profile_tighten,
+        )
+        hooks.append(profile_recorder)
+    if args.metrics_dir:
+        hooks.append(MetricsRecorder(args.metrics_dir))
+    if args.idle_window:
+        close_source = False
+        if utilization_source is None:
+            if args.fake_utilization:
+                utilization_source = FakeUtilization(args.fake_utilization)
+            else:
+                from .monitor import GPUMonitor
+
+                utilization_source = GPUMonitor(available_gpu_ids=[x["id"] for x in gpu_infos])
+                close_source = True
+        hooks.append(
+            Watchdog(
+                utilization_source,
+                window=args.idle_window,
+                threshold=args.idle_threshold,
+                action=args.idle_action,
+                interval=min(30, args.idle_window / 4),
+                close_source=close_source,
+            )
+        )
+    cache = None
+    if args.cache_dir:
+        cache = ResultCache(args.cache_dir)
+        hooks.append(cache)
+
+    job_logger = None
+    if job_logs and not args.inherit_output:
+        job_logger = JobLogger(
+            args.log_dir or os.path.splitext(args.config)[0] + ".logs",
+            max_bytes=int(args.log_max_mb * 1024 * 1024),
+            backup_count=args.log_backups,
+            compress=args.log_compress,
+        )
+        logger.info(f"The output of each job is written to {job_logger.log_dir}.")
+
+    scheduler = scheduler_cls(
+        policy,
+        gpu_infos=gpu_infos,
+        job_infos=job_infos,
+        max_workers=args.max_workers,
+        interval_for_loop=args.interval_for_loop,
+        launcher=args.launcher,
+        config=config,
+        max_retries=args.max_retries,
+        retry_backoff=args.retry_backoff,
+        hooks=hooks,
+        job_logger=job_logger,
+        daemon=args.daemon,
+        cache=cache,
+        **kwargs,
+    )
+    if not args.daemon:
+        scheduler.run()
+        return
+
+    from .control import ControlServer
+
+    with ControlServer(socket_path, scheduler) as server:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        logger.info(
+            f"Accepting jobs on {socket_path}, stop with `python -m runit.control --socket {socket_path} shutdown`."
+        )
+        scheduler.run()
+        server.shutdown()
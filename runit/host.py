@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+# @GitHub  : https://github.com/lartpang
+
+import copy
+import glob
+import logging
+import os
+import re
+
+from .policy import Policy
+
+logger = logging.getLogger(__name__)
+
+
+def parse_cpulist(cpulist: str) -> list:
+    # 解析 `0-3,8,10-11` 形式的CPU列表（与 /sys 和 taskset 的格式相同）
+    cpus = []
+    for part in cpulist.strip().split(","):
+        if not part:
+            continue
+        start, _, end = part.partition("-")
+        cpus.extend(range(int(start), int(end or start) + 1))
+    return cpus
+
+
+def get_available_cpus() -> list:
+    # 调度器可用的CPU，没有 `os.sched_getaffinity` 的平台（如macOS、Windows）上为所有CPU
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def read_mem_available():
+    # 主机当前可用的内存（MB），没有 /proc/meminfo（如非Linux）时返回None
+    if not os.path.exists("/proc/meminfo"):
+        return None
+    with open("/proc/meminfo", mode="r", encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("MemAvailable:"):
+                return int(line.split()[1]) // 1024
+    raise RuntimeError("Cannot read MemAvailable from /proc/meminfo.")
+
+
+def read_numa_cpus():
+    # NUMA节点 -> 该节点上的CPU，读取失败（如非Linux）时返回空字典
+    numa_cpus = {}
+    for path in glob.glob("/sys/devices/system/node/node*/cpulist"):
+        node = int(re.search(r"node(\d+)", path).group(1))
+        with open(path, mode="r", encoding="utf-8") as f:
+            numa_cpus[node] = parse_cpulist(f.read())
+    return numa_cpus
+
+
+class HostResourcePolicy(Policy):
+    """在GPU策略之外，按任务的 `cpus`（核数）和 `host_memory`（MB）管理主机的CPU核心和内存。
+
+    主机的容量默认为调度器可用的CPU（`os.sched_getaffinity`，没有时为 `os.cpu_count`）和当前可用的内存（`/proc/meminfo`），
+    无法读取内存时不限制 `host_memory`；两者都可以在配置的 `host` 中覆盖：
+    `host: {cpus: "0-31", memory: 128000, numa_nodes: {0: "0-15", 1: "16-31"}}`。
+    每个声明了 `cpus` 的任务会独占一组互不重叠的核心，并被绑定在这些核心上；
+    GPU给出了 `numa_node` 时，优先选择与其位于同一NUMA节点的核心。
+    未声明 `cpus` 和 `host_memory` 的任务不受影响。
+    """
+
+    def __init__(self, policy: Policy):
+        self.policy = policy
+
+    def setup(self, gpu_infos: list, config: dict):
+        self.policy.setup(gpu_infos, config)
+        self.num_gpus = self.policy.num_gpus
+
+        host = config.get("host") or {}
+        cpus = host.get("cpus")
+        if cpus is None:
+            cpus = get_available_cpus()
+        elif isinstance(cpus, str):
+            cpus = parse_cpulist(cpus)
+        self.total_cpus = len(cpus)
+        self.free_cpus = set(cpus)
+        self.total_memory = self.free_memory = host.get("memory") or read_mem_available() or float("inf")
+
+        if "numa_nodes" in host:
+            numa_cpus = {int(k): parse_cpulist(str(v)) for k, v in host["numa_nodes"].items()}
+        else:
+            numa_cpus = read_numa_cpus()
+        self.gpu_cpus = {}  # gpu_id -> 同一NUMA节点上的CPU
+        for gpu_info in gpu_infos:
+            if gpu_info.get("numa_node") is not None:
+                self.gpu_cpus[str(gpu_info["id"])] = set(numa_cpus.get(gpu_info["numa_node"], []))
+        # 以任务信息的id为键：同一个任务的acquire和release使用同一个字典，policy的副本中也是如此
+        self.allocations = {}  # id(job_info) -> (cpu_ids, host_memory)
+        if self.total_memory == float("inf"):
+            logger.warning("Cannot detect the host memory, `host_memory` of the jobs is not limited.")
+        logger.info(f"Host resources: {self.total_cpus} CPUs, {self.total_memory} MB memory.")
+
+    def check(self, job_id: int, job_info: dict, warn: bool = True):
+        self.policy.check(job_id, job_info, warn)
+        if job_info.get("cpus", 0) > self.total_cpus:
+            raise ValueError(f"The number of cpus in job {job_id} is larger than the number of available cpus.")
+        if job_info.get("host_memory", 0) > self.total_memory:
+            raise ValueError(f"The host memory of job {job_id} is larger than the available host memory.")
+
+    def job_shape(self, job_info: dict) -> tuple:
+        return self.policy.job_shape(job_info) + (job_info.get("cpus", 0), job_info.get("host_memory", 0))
+
+    def refresh(self):
+        self.policy.refresh()
+
+    def select_cpus(self, num_cpus: int, gpu_ids: list):
+        # 先选择与GPU位于同一NUMA节点的核心，不够时再从其他节点补足
+        local_cpus = set()
+        for gpu_id in gpu_ids:
+            local_cpus |= self.gpu_cpus.get(gpu_id, set())
+        local_cpus &= self.free_cpus
+        selected = sorted(local_cpus)[:num_cpus]
+        if len(selected) < num_cpus:
+            selected += sorted(self.free_cpus - local_cpus)[: num_cpus - len(selected)]
+        return selected
+
+    def acquire(self, job_info: dict):
+        num_cpus = job_info.get("cpus", 0)
+        host_memory = job_info.get("host_memory", 0)
+        if num_cpus > len(self.free_cpus) or host_memory > self.free_memory:
+            logger.debug(f"Skipping {job_info}, not enough host resources available.")
+            return None
+        gpu_ids = self.policy.acquire(job_info)
+        if gpu_ids is None:
+            return None
+
+        cpu_ids = self.select_cpus(num_cpus, gpu_ids)
+        self.free_cpus.difference_update(cpu_ids)
+        self.free_memory -= host_memory
+        self.allocations[id(job_info)] = (cpu_ids, host_memory)
+        return gpu_ids
+
+    def release(self, job_info: dict, gpu_ids: list):
+        self.policy.release(job_info, gpu_ids)
+        cpu_ids, host_memory = self.allocations.pop(id(job_info))
+        self.free_cpus.update(cpu_ids)
+        self.free_memory += host_memory
+
+    def get_cpu_ids(self, job_info: dict):
+        cpu_ids, _ = self.allocations.get(id(job_info), (None, 0))
+        return cpu_ids or None
+
+    def clone(self):
+        # 内部的策略可能无法直接复制（如 `AdaptiveMemoryPolicy`），交给它自己处理
+        policy, self.policy = self.policy, None
+        try:
+            cloned = copy.deepcopy(self)
+        finally:
+            self.policy = policy
+        cloned.policy = policy.clone()
+        return cloned
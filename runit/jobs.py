@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+# @GitHub  : https://github.com/lartpang
+
+import heapq
+from collections import Counter
+from enum import Enum
+
+from .sweep import Sweep
+
+
+class STATUS(Enum):
+    WAITING = 0
+    RUNNING = 1
+    DONE = 2
+    FAILED = 3
+    RETRYING = 4  # 失败后等待退避时间结束再重新调度
+    CANCELLED = 5  # 被用户取消
+    BLOCKED = 6  # 等待 `depends_on` 中的任务完成
+
+
+# 不会再发生变化的状态
+FINISHED_STATUSES = (STATUS.DONE, STATUS.FAILED, STATUS.CANCELLED)
+
+
+class Job:
+    def __init__(self, job_id: int, info: dict):
+        self.job_id = job_id
+        self.info = info
+        self.status = STATUS.WAITING
+        self.gpu_ids = None
+        self.cpu_ids = None
+        self.start_time = None  # 调度器决定启动任务的时刻
+        self.spawn_time = None  # launcher创建出子进程的时刻，无法得知时为None
+        self.end_time = None  # launcher观测到任务结束的时刻
+        self.attempts = 0
+        self.ready_time = None
+        self.sweep = None  # 由sweep生成的任务所属的sweep
+        self.num_blocking = 0  # 尚未完成的上游任务数
+        self.preemptions = 0  # 被抢占的次数
+
+    @property
+    def name(self):
+        return self.info.get("name", self.job_id)
+
+    @property
+    def priority(self):
+        return self.info.get("priority", 0)
+
+    @property
+    def max_retries(self):
+        return self.info.get("max_retries")
+
+    @property
+    def preemptible(self):
+        return self.info.get("preemptible", False)
+
+    @property
+    def depends_on(self):
+        depends_on = self.info.get("depends_on", [])
+        return depends_on if isinstance(depends_on, list) else [depends_on]
+
+    @property
+    def timeout(self):
+        return self.info.get("timeout")
+
+    @property
+    def estimated_duration(self):
+        return self.info.get("estimated_duration")
+
+    def expected_end_time(self, now):
+        # 未给出预计时长的任务视为永远不会结束；超出预计时长的任务视为马上结束
+        if self.estimated_duration is None:
+            return float("inf")
+        return max(self.start_time + self.estimated_duration, now)
+
+    def __repr__(self) -> str:
+        return f"Job({self.job_id}, {self.name}, {self.status.name})"
+
+
+class JobTable:
+    """调度主进程内的任务状态表。
+
+    按状态维护计数和集合，使得“是否全部完成”为O(1)，而等待队列使用小根堆（惰性删除），
+    取下一个可运行的任务为O(log n)。等待队列按 `priority` 从高到低、同优先级按配置中的顺序排列。
+    处于退避中的任务单独存放在按 `ready_time` 排序的小根堆中。
+
+    带有 `sweep` 的条目不会被展开，而是预留一段连续的任务ID（保持配置中的顺序），
+    其中的任务由调度器按需通过 `Sweep.pop` 生成后再加入；`len` 包括尚未生成的任务。
+    """
+
+    def __init__(self, job_infos: list):
+        self.jobs = {}
+        self.counts = Counter()
+        self.running = set()
+        self.sweeps = []
+        self.names = {}  # name -> job_ids
+        self.children = {}  # job_id -> 依赖它的job_ids
+        self.num_jobs = 0
+        self._waiting = []
+        self._queued = set()  # 在_waiting中有条目的job_ids，同一个任务只保留一个条目
+        self._retrying = []
+        for job_info in job_infos:
+            if "sweep" in job_info:
+                self.add_sweep(job_info)
+            else:
+                self.add(Job(self.num_jobs, job_info))
+
+    def __len__(self):
+        return self.num_jobs
+
+    def __contains__(self, job_id: int):
+        return job_id in self.jobs
+
+    def __getitem__(self, job_id: int) -> Job:
+        return self.jobs[job_id]
+
+    def __iter__(self):
+        return iter(self.jobs.values())
+
+    def sort_key(self, job: Job):
+        return -job.priority, job.job_id
+
+    def add_sweep(self, job_info: dict) -> Sweep:
+        sweep = Sweep(job_info, first_id=self.num_jobs)
+        self.sweeps.append(sweep)
+        self.num_jobs += len(sweep)
+        return sweep
+
+    def add(self, job: Job):
+        self.jobs[job.job_id] = job
+        self.names.setdefault(str(job.name), []).append(job.job_id)
+        self.num_jobs = max(self.num_jobs, job.job_id + 1)
+        self.counts[job.status] += 1
+        if job.status is STATUS.WAITING:
+            self.push_waiting(job)
+
+    def find(self, job) -> list:
+        # job可以是任务的ID或名字，同名的任务全部返回
+        if str(job).isdigit() and int(job) in self.jobs:
+            return [self.jobs[int(job)]]
+        if str(job) not in self.names:
+            raise KeyError(f"Unknown job: {job}")
+        return [self.jobs[job_id] for job_id in self.names[str(job)]]
+
+    def add_dependency(self, parent: Job, child: Job):
+        self.children.setdefault(parent.job_id, []).append(child.job_id)
+        child.num_blocking += 1
+
+    def check_cycles(self):
+        # Kahn算法：从不被阻塞的任务出发，无法到达的被阻塞任务处在环上
+        num_blocking = {job_id: job.num_blocking for job_id, job in self.jobs.items()}
+        ready = [job_id for job_id, num in num_blocking.items() if num == 0]
+        while ready:
+            for child_id in self.children.get(ready.pop(), []):
+                num_blocking[child_id] -= 1
+                if num_blocking[child_id] == 0:
+                    ready.append(child_id)
+        cycle = [str(self.jobs[job_id].name) for job_id, num in num_blocking.items() if num > 0]
+        if cycle:
+            raise ValueError(f"The dependencies of these jobs form a cycle: {', '.join(cycle)}")
+
+    def set_status(self, job: Job, status: STATUS):
+        if job.status is status:
+            return
+        self.counts[job.status] -= 1
+        self.counts[status] += 1
+        if job.status is STATUS.RUNNING:
+            self.running.discard(job.job_id)
+        job.status = status
+        if status is STATUS.RUNNING:
+            self.running.add(job.job_id)
+        elif status is STATUS.WAITING:
+            self.push_waiting(job)
+        elif status is STATUS.RETRYING:
+            heapq.heappush(self._retrying, (job.ready_time, job.job_id))
+
+    def num_waiting(self):
+        return self.counts[STATUS.WAITING] + self.counts[STATUS.RETRYING]
+
+    def all_finished(self):
+        return sum(self.counts[s] for s in FINISHED_STATUSES) == self.num_jobs
+
+    def next_ready_time(self):
+        return self._retrying[0][0] if self._retrying else None
+
+    def wake_retrying(self, now):
+        # 将退避时间已经结束的任务放回等待队列
+        while self._retrying and self._retrying[0][0] <= now:
+            _, job_id = heapq.heappop(self._retrying)
+            job = self.jobs[job_id]
+            if job.status is STATUS.RETRYING:  # 退避期间可能已被取消
+                self.set_status(job, STATUS.WAITING)
+
+    def pop_waiting(self):
+        # 惰性删除：跳过状态已经不是WAITING的陈旧条目
+        while self._waiting:
+            _, job_id = heapq.heappop(self._waiting)
+            self._queued.discard(job_id)
+            job = self.jobs[job_id]
+            if job.status is STATUS.WAITING:
+                return job
+        return None
+
+    def iter_waiting(self):
+        """按顺序弹出所有等待中的任务，调用方需要将未被调度的任务通过 `push_waiting` 放回。"""
+        while True:
+            job = self.pop_waiting()
+            if job is None:
+                return
+            yield job
+
+    def push_waiting(self, job: Job):
+        # 离开WAITING（如被依赖阻塞）又回到WAITING的任务，其旧条目仍在堆中且排序键不变，不再重复加入，
+        # 否则同一轮调度中会被弹出两次
+        if job.job_id in self._queued:
+            return
+        self._queued.add(job.job_id)
+        heapq.heappush(self._waiting, (self.sort_key(job), job.job_id))
+
+    def set_priority(self, job: Job, priority: int):
+        # 排序键改变后无法在堆中原地更新，重建等待队列（O(n)，只在用户调整优先级时发生）
+        job.info["priority"] = priority
+        self._queued = {job_id for _, job_id in self._waiting if self.jobs[job_id].status is STATUS.WAITING}
+        self._waiting = [(self.sort_key(self.jobs[job_id]), job_id) for job_id in self._queued]
+        heapq.heapify(self._waiting)
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+# @GitHub  : https://github.com/lartpang
+
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import Counter
+
+from .jobs import STATUS
+
+logger = logging.getLogger(__name__)
+
+
+def get_job_key(job, occurrences: Counter):
+    # 使用名字和命令标识任务，完全相同的任务按出现的顺序区分，使得修改配置中任务的顺序不影响恢复
+    digest = hashlib.sha1(f"{job.name}\n{job.info['command']}".encode("utf-8")).hexdigest()[:16]
+    key = f"{digest}#{occurrences[digest]}"
+    occurrences[digest] += 1
+    return key
+
+
+def get_job_keys(jobs, occurrences: Counter = None):
+    occurrences = Counter() if occurrences is None else occurrences
+    return {job.job_id: get_job_key(job, occurrences) for job in jobs}
+
+
+class Journal:
+    """只追加的任务状态日志（JSON Lines），每次状态变化都会立即落盘，用于在调度器意外退出后恢复。"""
+
+    def __init__(self, path: str, resume: bool = False):
+        self.path = path
+        self.resume = resume
+        self.keys = {}
+        self.occurrences = Counter()
+        self.last_status = {}
+        if resume and os.path.exists(path):
+            self.last_status = self.load(path)
+        # 不恢复时重新开始记录
+        self.file = open(path, mode="a" if resume else "w", encoding="utf-8")
+
+    def attach(self, scheduler):
+        self.jobs = scheduler.jobs
+        self.keys = get_job_keys(scheduler.jobs, self.occurrences)
+        if self.resume:
+            self.restore(scheduler.jobs)
+
+    def on_submit(self, job):
+        # 运行期间提交的任务，若在日志中已经完成（如重启后重新提交）则同样跳过
+        self.keys[job.job_id] = get_job_key(job, self.occurrences)
+        if self.resume and self.restore_job(self.jobs, job):
+            logger.debug(f"Skip job {job.name}, which is completed in {self.path}.")
+
+    @staticmethod
+    def load(path: str):
+        last_status = {}
+        with open(path, mode="r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # 崩溃时可能只写入了半行
+                    continue
+                last_status[record["key"]] = STATUS[record["status"]]
+        return last_status
+
+    def restore_job(self, jobs, job):
+        # 返回任务是否被跳过
+        status = self.last_status.get(self.keys[job.job_id])
+        if status in (STATUS.DONE, STATUS.CANCELLED):
+            jobs.set_status(job, status)
+            return True
+        if status is STATUS.RUNNING:
+            logger.warning(f"Job {job.name} was running when the scheduler stopped, requeue it.")
+        return False
+
+    def restore(self, jobs):
+        num_skipped = sum(self.restore_job(jobs, job) for job in jobs)
+        logger.info(f"Resume from {self.path}: skip {num_skipped} completed or cancelled jobs.")
+
+    def on_status(self, job):
+        record = {
+            "time": time.time(),
+            "key": self.keys[job.job_id],
+            "name": job.name,
+            "command": job.info["command"],
+            "status": job.status.name,
+            "attempts": job.attempts,
+        }
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
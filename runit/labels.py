@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+# @GitHub  : https://github.com/lartpang
+
+import json
+
+
+def matches(value, condition) -> bool:
+    # 条件可以是一个值、可选值的列表，或数值范围 `{min: ..., max: ...}`；值之间按字符串比较
+    if isinstance(condition, dict):
+        unknown = set(condition) - {"min", "max"}
+        if unknown:
+            raise ValueError(f"Unknown keys in the label condition {condition}: {unknown}")
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return False
+        return condition.get("min", float("-inf")) <= value <= condition.get("max", float("inf"))
+    if isinstance(condition, (list, tuple)):
+        return any(str(value) == str(x) for x in condition)
+    return str(value) == str(condition)
+
+
+def get_selector_key(selector: dict) -> str:
+    # 选择器的规范形式，同时用作 `job_shape` 中的非数值项
+    return json.dumps(selector, sort_keys=True) if selector else ""
+
+
+class LabelIndex:
+    """GPU的标签（配置中每个GPU的 `labels`）到GPU的索引，用于匹配任务的 `requires` 和 `prefers`。
+
+    ```yaml
+    gpu:
+      - {id: 0, memory: 81920, labels: {model: a100, memory_gb: 80}}
+      - {id: 1, memory: 24576, labels: {model: "4090", memory_gb: 24}}
+    job:
+      - command: "python train.py"
+        num_gpus: 1
+        requires: {memory_gb: {min: 40}}  # 只能运行在满足所有条件的GPU上
+      - command: "python eval.py"
+        num_gpus: 1
+        prefers: {model: ["4090", "3090"]}  # 优先选择满足更多条件的GPU，都不满足时也可以运行
+    ```
+
+    标签不会改变，每个选择器匹配的GPU集合只在第一次使用时计算，之后的匹配为O(1)。
+    """
+
+    def __init__(self, gpu_infos: list):
+        self.labels = {str(gpu_info["id"]): dict(gpu_info.get("labels") or {}) for gpu_info in gpu_infos}
+        self.matched = {}  # 选择器 -> 匹配的GPU
+        self.scores = {}  # 选择器 -> {gpu_id: 满足的条件数}
+
+    def __deepcopy__(self, memo):
+        # policy的副本可以共享同一个索引
+        return self
+
+    def get_score(self, gpu_id: str, selector: dict) -> int:
+        labels = self.labels[gpu_id]
+        return sum(name in labels and matches(labels[name], condition) for name, condition in selector.items())
+
+    def match(self, selector: dict) -> frozenset:
+        key = get_selector_key(selector)
+        if key not in self.matched:
+            self.matched[key] = frozenset(
+                gpu_id for gpu_id in self.labels if self.get_score(gpu_id, selector) == len(selector)
+            )
+        return self.matched[key]
+
+    def sort(self, gpu_ids: list, prefers: dict) -> list:
+        # 稳定排序：满足的 `prefers` 条件相同的GPU保持原来的顺序
+        key = get_selector_key(prefers)
+        if key not in self.scores:
+            self.scores[key] = {gpu_id: self.get_score(gpu_id, prefers) for gpu_id in self.labels}
+        scores = self.scores[key]
+        return sorted(gpu_ids, key=lambda gpu_id: -scores[gpu_id])
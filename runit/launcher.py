@@ -0,0 +1,436 @@
+# -*- coding: utf-8 -*-
+# @GitHub  : https://github.com/lartpang
+
+import asyncio
+import logging
+import os
+import selectors
+import signal
+import subprocess
+import threading
+import time
+from multiprocessing import Pool
+
+from .logs import open_job_log
+
+logger = logging.getLogger(__name__)
+
+
+# 标记子进程（及其所有后代进程）属于哪个调度器的哪个任务，用于将GPU上的进程归属到任务
+JOB_ENV_KEY = "RUNIT_JOB"
+
+
+def get_job_marker(job_id: int):
+    return f"{os.getpid()}:{job_id}"
+
+
+def build_env(job, gpu_ids: list):
+    # 设置子程序环境变量
+    env = os.environ.copy()
+    env["CUDA_VISIBLE_DEVICES"] = ",".join(gpu_ids)
+    # 任务自己的环境变量
+    env.update({key: str(value) for key, value in job.info.get("env", {}).items()})
+    env[JOB_ENV_KEY] = get_job_marker(job.job_id)
+    if job.preemptible:
+        # 被抢占后重新运行的任务可以据此从自己的checkpoint恢复
+        env["RUNIT_PREEMPTIONS"] = str(job.preemptions)
+    if job.cpu_ids:
+        # 让常见的数值库按分配到的核数创建线程
+        for key in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+            env.setdefault(key, str(len(job.cpu_ids)))
+    return env
+
+
+def popen(job_cmd: str, env: dict, cpu_ids: list = None, **kwargs):
+    if not cpu_ids or not hasattr(os, "sched_setaffinity"):
+        # 不支持设置亲和性的平台（如macOS、Windows）上只按核数准入，不绑定核心
+        return subprocess.Popen(job_cmd, shell=True, env=env, **kwargs)
+    # CPU亲和性按线程设置并由fork出的子进程继承：临时绑定当前线程，子进程从第一条指令起就在这些核心上
+    affinity = os.sched_getaffinity(0)
+    os.sched_setaffinity(0, cpu_ids)
+    try:
+        return subprocess.Popen(job_cmd, shell=True, env=env, **kwargs)
+    finally:
+        os.sched_setaffinity(0, affinity)
+
+
+def start_process(job_cmd: str, env: dict, log_args: tuple = None, cpu_ids: list = None, new_session=False):
+    # 提供log_args时，子进程的stdout和stderr通过管道写入任务自己的日志文件，否则继承调度器的输出；
+    # new_session为真时子进程在自己的会话（进程组）中运行，参见 `signal_group`
+    if log_args is None:
+        return popen(job_cmd, env, cpu_ids, start_new_session=new_session), None
+    job_log = open_job_log(*log_args)
+    try:
+        sub_proc = popen(
+            job_cmd,
+            env,
+            cpu_ids,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            start_new_session=new_session,
+        )
+    except Exception:
+        job_log.close()
+        raise
+    return sub_proc, job_log
+
+
+def signal_group(sub_proc: subprocess.Popen, signum: int):
+    # 命令由shell执行，只向shell发送信号时其启动的进程收不到，因此发给整个进程组
+    try:
+        os.killpg(sub_proc.pid, signum)
+    except ProcessLookupError:
+        pass
+
+
+def wait_group(sub_proc: subprocess.Popen, killed):
+    # 等待进程组中剩余的进程（如shell启动的、仍在处理信号的程序）全部退出；
+    # killed() 为真（已经发送过SIGKILL）1秒后仍有成员时，剩下的只会是尚未被回收的僵尸进程
+    kill_time = None
+    while True:
+        try:
+            os.killpg(sub_proc.pid, 0)
+        except ProcessLookupError:
+            return
+        if killed():
+            kill_time = kill_time or time.monotonic()
+            if time.monotonic() - kill_time > 1:
+                return
+        time.sleep(0.1)
+
+
+def read_output(sub_proc: subprocess.Popen, job_log):
+    # 将非阻塞管道中当前可读的所有数据写入日志，返回管道是否已经关闭
+    while True:
+        try:
+            chunk = os.read(sub_proc.stdout.fileno(), 65536)
+        except BlockingIOError:
+            return False
+        if not chunk:
+            return True
+        job_log.write(chunk)
+
+
+def pump(sub_proc: subprocess.Popen, job_log, interval=0.1):
+    # 将子进程的输出写入日志，直到子进程退出，返回其退出码；
+    # 在后台运行的孙进程可能一直持有管道，因此不等待管道关闭，而是在子进程退出后取走剩余的输出
+    if job_log is None:
+        return sub_proc.wait()
+    fd = sub_proc.stdout.fileno()
+    os.set_blocking(fd, False)
+    try:
+        with selectors.DefaultSelector() as selector:
+            selector.register(fd, selectors.EVENT_READ)
+            while sub_proc.poll() is None:
+                if selector.select(timeout=interval) and read_output(sub_proc, job_log):
+                    # 管道已经关闭，只需等待子进程退出
+                    break
+        returncode = sub_proc.wait()
+        read_output(sub_proc, job_log)
+        return returncode
+    finally:
+        sub_proc.stdout.close()
+        job_log.close()
+
+
+def init_worker():
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def worker(job_id: int, job_cmd: str, env: dict, log_args: tuple = None, cpu_ids: list = None):
+    try:
+        sub_proc, job_log = start_process(job_cmd, env, log_args, cpu_ids)
+    except Exception as e:
+        return job_id, None, str(e)
+    with sub_proc:
+        try:
+            return job_id, pump(sub_proc, job_log), None
+        except Exception as e:
+            sub_proc.terminate()
+            return job_id, None, str(e)
+
+
+class Launcher:
+    """负责启动任务并在任务结束时调用 `notify(job_id, returncode, error)` 唤醒调度器。
+
+    提供 `job_logger` 时，每个任务的输出会写入各自的日志文件（参见 `logs.JobLogger`）。
+    """
+
+    # 能否通过 `send_signal` 向运行中的任务发送信号（用于取消和抢占）
+    can_signal = False
+
+    def __init__(self, notify, job_logger=None):
+        self.notify = notify
+        self.job_logger = job_logger
+
+    def get_log_args(self, job):
+        return None if self.job_logger is None else self.job_logger.get_args(job)
+
+    def start_process(self, job, gpu_ids: list):
+        sub_proc, job_log = start_process(
+            job.info["command"], build_env(job, gpu_ids), self.get_log_args(job), job.cpu_ids, new_session=True
+        )
+        job.spawn_time = time.monotonic()
+        return sub_proc, job_log
+
+    def start(self):
+        pass
+
+    def launch(self, job, gpu_ids: list):
+        raise NotImplementedError
+
+    def send_signal(self, job_id: int, signum: int) -> bool:
+        # 返回是否成功地向运行中的任务发送了信号
+        return False
+
+    def close(self):
+        pass
+
+    def terminate(self):
+        pass
+
+
+class PoolLauncher(Launcher):
+    """在 `multiprocessing.Pool` 的worker进程中等待任务结束。"""
+
+    def __init__(self, notify, max_workers: int, job_logger=None):
+        super().__init__(notify, job_logger)
+        self.max_workers = max_workers
+
+    def start(self):
+        # 在创建进程池之前注册信号处理器，以便在接收到中断信号时执行清理操作
+        original_sigint_handler = signal.signal(signal.SIGINT, signal.SIG_IGN)
+        self.pool = Pool(processes=self.max_workers, initializer=init_worker)
+        # 将原始的信号处理器恢复
+        signal.signal(signal.SIGINT, original_sigint_handler)
+
+    def on_error(self, error):
+        # worker本身已经捕获了所有异常，这里仅作为兜底
+        logger.error(f"Worker failed: {error}")
+
+    def launch(self, job, gpu_ids: list):
+        self.pool.apply_async(
+            worker,
+            args=(job.job_id, job.info["command"], build_env(job, gpu_ids), self.get_log_args(job), job.cpu_ids),
+            callback=lambda result: self.notify(*result),
+            error_callback=self.on_error,
+        )
+
+    def close(self):
+        # 关闭进程池并等待所有任务完成
+        self.pool.close()
+        self.pool.join()
+
+    def terminate(self):
+        self.pool.terminate()
+        self.pool.join()
+
+
+class LocalLauncher(Launcher):
+    """由调度主进程直接创建并监督子进程，不依赖进程池。
+
+    每个子进程对应一个轻量的等待线程，子进程退出后立即通知调度器。
+    """
+
+    can_signal = True
+
+    def __init__(self, notify, job_logger=None):
+        super().__init__(notify, job_logger)
+        self.procs = {}
+        self.signals = {}  # job_id -> 最后一次发送给该任务的信号
+        self.threads = []
+        self.lock = threading.Lock()
+
+    def watch(self, job_id: int, sub_proc: subprocess.Popen, job_log):
+        try:
+            returncode, error = pump(sub_proc, job_log), None
+            if job_id in self.signals:
+                # 被要求停止的任务，等到整个进程组都退出后才算结束，期间仍然可以被SIGKILL
+                wait_group(sub_proc, lambda: self.signals.get(job_id) == signal.SIGKILL)
+        except Exception as e:
+            returncode, error = None, str(e)
+        with self.lock:
+            self.procs.pop(job_id, None)
+            self.signals.pop(job_id, None)
+        self.notify(job_id, returncode, error)
+
+    def launch(self, job, gpu_ids: list):
+        try:
+            sub_proc, job_log = self.start_process(job, gpu_ids)
+        except Exception as e:
+            self.notify(job.job_id, None, str(e))
+            return
+        thread = threading.Thread(target=self.watch, args=(job.job_id, sub_proc, job_log), daemon=True)
+        with self.lock:
+            self.procs[job.job_id] = sub_proc
+            self.threads = [t for t in self.threads if t.is_alive()]
+            self.threads.append(thread)
+        thread.start()
+
+    def send_signal(self, job_id: int, signum: int) -> bool:
+        with self.lock:
+            sub_proc = self.procs.get(job_id)
+            if sub_proc is not None:
+                self.signals[job_id] = signum
+        if sub_proc is None:
+            return False
+        signal_group(sub_proc, signum)
+        return True
+
+    def close(self):
+        with self.lock:
+            threads = list(self.threads)
+        for thread in threads:
+            thread.join()
+
+    def terminate(self):
+        with self.lock:
+            procs = list(self.procs.values())
+        for sub_proc in procs:
+            signal_group(sub_proc, signal.SIGTERM)
+        for sub_proc in procs:
+            sub_proc.wait()
+
+
+class AsyncLauncher(Launcher):
+    """在一个后台线程的asyncio事件循环中监督所有子进程，同时运行的任务数只受资源的限制。
+
+    Linux上通过pidfd在子进程退出时唤醒事件循环，不需要为每个子进程单独占用线程或进程；
+    不支持pidfd的平台上退化为每个子进程一个等待线程。
+    会阻塞的操作都在独立的线程中执行，而不是事件循环默认的线程池：其线程数有限，
+    任务多于线程数时，后面的任务退出后要等到有线程空闲才能被发现。
+    """
+
+    can_signal = True
+
+    def __init__(self, notify, job_logger=None):
+        super().__init__(notify, job_logger)
+        self.procs = {}
+        self.signals = {}  # job_id -> 最后一次发送给该任务的信号
+        self.futures = []
+        self.lock = threading.Lock()
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def run_in_thread(self, func, *args):
+        # 在新的线程中执行func，返回其结果的future
+        future = self.loop.create_future()
+
+        def set_result(result, error):
+            if future.done():
+                return
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+        def target():
+            try:
+                result, error = func(*args), None
+            except Exception as e:
+                result, error = None, e
+            self.loop.call_soon_threadsafe(set_result, result, error)
+
+        threading.Thread(target=target, daemon=True).start()
+        return future
+
+    async def wait(self, sub_proc: subprocess.Popen):
+        pidfd = None
+        if hasattr(os, "pidfd_open"):
+            try:
+                pidfd = os.pidfd_open(sub_proc.pid)
+            except OSError:
+                pass
+        if pidfd is None:
+            return await self.run_in_thread(sub_proc.wait)
+
+        exited = self.loop.create_future()
+        self.loop.add_reader(pidfd, lambda: exited.done() or exited.set_result(None))
+        try:
+            await exited
+        finally:
+            self.loop.remove_reader(pidfd)
+            os.close(pidfd)
+        # 子进程已经退出，这里不会阻塞
+        return sub_proc.wait()
+
+    async def supervise(self, job_id: int, sub_proc: subprocess.Popen, job_log):
+        if job_log is not None:
+            os.set_blocking(sub_proc.stdout.fileno(), False)
+            self.loop.add_reader(sub_proc.stdout.fileno(), read_output, sub_proc, job_log)
+        try:
+            returncode, error = await self.wait(sub_proc), None
+            if job_id in self.signals:
+                # 被要求停止的任务，等到整个进程组都退出后才算结束，期间仍然可以被SIGKILL
+                await self.run_in_thread(wait_group, sub_proc, lambda: self.signals.get(job_id) == signal.SIGKILL)
+        except Exception as e:
+            returncode, error = None, str(e)
+        if job_log is not None:
+            # 子进程退出后取走管道中剩余的输出；仍在后台运行的孙进程的后续输出会被丢弃
+            self.loop.remove_reader(sub_proc.stdout.fileno())
+            read_output(sub_proc, job_log)
+            sub_proc.stdout.close()
+            await self.run_in_thread(job_log.close)
+        with self.lock:
+            self.procs.pop(job_id, None)
+            self.signals.pop(job_id, None)
+        self.notify(job_id, returncode, error)
+
+    def launch(self, job, gpu_ids: list):
+        try:
+            sub_proc, job_log = self.start_process(job, gpu_ids)
+        except Exception as e:
+            self.notify(job.job_id, None, str(e))
+            return
+        with self.lock:
+            self.procs[job.job_id] = sub_proc
+            self.futures = [f for f in self.futures if not f.done()]
+            self.futures.append(
+                asyncio.run_coroutine_threadsafe(self.supervise(job.job_id, sub_proc, job_log), self.loop)
+            )
+
+    def send_signal(self, job_id: int, signum: int) -> bool:
+        with self.lock:
+            sub_proc = self.procs.get(job_id)
+            if sub_proc is not None:
+                self.signals[job_id] = signum
+        if sub_proc is None:
+            return False
+        signal_group(sub_proc, signum)
+        return True
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+    def close(self):
+        with self.lock:
+            futures = list(self.futures)
+        for future in futures:
+            future.result()
+        self.stop()
+
+    def terminate(self):
+        with self.lock:
+            procs = list(self.procs.values())
+        for sub_proc in procs:
+            signal_group(sub_proc, signal.SIGTERM)
+        # 等待事件循环处理完所有子进程的退出
+        self.close()
+
+
+LAUNCHERS = ("async", "local", "pool")
+
+
+def build_launcher(name: str, notify, max_workers: int, job_logger=None) -> Launcher:
+    if name == "pool":
+        return PoolLauncher(notify, max_workers=max_workers, job_logger=job_logger)
+    if name == "local":
+        return LocalLauncher(notify, job_logger=job_logger)
+    if name == "async":
+        return AsyncLauncher(notify, job_logger=job_logger)
+    raise ValueError(f"Unknown launcher: {name}")
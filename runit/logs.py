@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+# @GitHub  : https://github.com/lartpang
+
+import gzip
+import os
+import re
+import shutil
+import time
+
+
+class JobLog:
+    """单个任务的输出文件，超过 `max_bytes` 时按 `<name>.log.1`、`<name>.log.2`... 轮转，最多保留 `backup_count` 个旧文件。"""
+
+    def __init__(self, path: str, max_bytes=0, backup_count=3, compress=False):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.compress = compress
+        self.file = open(path, mode="ab")
+        self.size = self.file.tell()
+
+    def write(self, data: bytes):
+        if self.max_bytes and self.size and self.size + len(data) > self.max_bytes:
+            self.rotate()
+        self.file.write(data)
+        self.file.flush()
+        self.size += len(data)
+
+    def rotate(self):
+        self.file.close()
+        for idx in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{idx}"):
+                os.replace(f"{self.path}.{idx}", f"{self.path}.{idx + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        self.file = open(self.path, mode="wb")
+        self.size = 0
+
+    def close(self):
+        self.file.close()
+        if not self.compress:
+            return
+        # 任务结束后将日志（及其轮转的旧文件）压缩归档；每次运行（重试、被抢占后重新排队、恢复）追加为一个新的gzip成员，
+        # 之前运行的输出仍然保留，可以用 `zcat` 依次读出
+        for path in [self.path] + [f"{self.path}.{idx}" for idx in range(1, self.backup_count + 1)]:
+            if not os.path.exists(path):
+                continue
+            with open(path, mode="rb") as src, gzip.open(path + ".gz", mode="ab") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(path)
+
+
+def to_safe_name(name):
+    # 文件名中只保留安全的字符
+    return re.sub(r"[^\w.-]+", "_", str(name))
+
+
+def get_log_name(job_id: int, name):
+    return f"{job_id}-{to_safe_name(name)}.log"
+
+
+class JobLogger:
+    """为每个任务在 `log_dir` 中创建独立的输出文件。"""
+
+    def __init__(self, log_dir: str, max_bytes=100 * 1024 * 1024, backup_count=3, compress=False):
+        self.log_dir = log_dir
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.compress = compress
+        os.makedirs(log_dir, exist_ok=True)
+
+    def get_args(self, job):
+        # 可以被pickle的参数，用于在进程池的worker中创建JobLog
+        path = os.path.join(self.log_dir, get_log_name(job.job_id, job.name))
+        header = f"==== {time.strftime('%Y-%m-%d %H:%M:%S')} attempt {job.attempts + 1}: {job.info['command']} ====\n"
+        return path, self.max_bytes, self.backup_count, self.compress, header
+
+
+def open_job_log(path: str, max_bytes: int, backup_count: int, compress: bool, header: str) -> JobLog:
+    job_log = JobLog(path, max_bytes=max_bytes, backup_count=backup_count, compress=compress)
+    job_log.write(header.encode("utf-8"))
+    return job_log
@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+# @GitHub  : https://github.com/lartpang
+
+import json
+import logging
+import os
+import threading
+
+from .jobs import STATUS
+from .profile import percentile
+
+logger = logging.getLogger(__name__)
+
+
+# 每次运行（包括重试）记录的时长（秒）及其说明
+DURATIONS = {
+    "queue_wait": "The time from being ready to being launched.",
+    "launch_latency": "The time from the scheduling decision to the creation of the process.",
+    "run_time": "The time from the scheduling decision to the exit of the process.",
+    "release_latency": "The time from the exit of the process to the release of its resources.",
+}
+
+
+def write_atomic(path: str, text: str):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, mode="w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+class GPUUsage:
+    """单个GPU的占用情况，GPU上没有任何任务的时间计为空闲。"""
+
+    def __init__(self, since):
+        self.since = since
+        self.num_jobs = 0
+        self.idle_since = since
+        self.idle_time = 0
+
+    def allocate(self, now):
+        if self.num_jobs == 0:
+            self.idle_time += max(now - self.idle_since, 0)
+        self.num_jobs += 1
+
+    def release(self, now):
+        self.num_jobs -= 1
+        if self.num_jobs == 0:
+            self.idle_since = now
+
+    def get_idle_time(self, now):
+        if self.num_jobs == 0:
+            return self.idle_time + max(now - self.idle_since, 0)
+        return self.idle_time
+
+    def get_busy_time(self, now):
+        return now - self.since - self.get_idle_time(now)
+
+
+class MetricsRecorder:
+    """记录每个任务每次运行的排队时间、启动延迟、运行时长和释放延迟，以及每个GPU的空闲时间。
+
+    GPU的空闲时间从其上最后一个任务退出开始，到下一次分配为止，包含了调度器处理退出事件的耗时。
+    结果写入 `metrics_dir`：
+    - `metrics.prom`：Prometheus的文本格式，运行期间每隔 `interval` 秒更新，可由node_exporter的textfile collector读取；
+    - `summary.json`：各项时长的统计量、每个GPU的利用率和每次运行的明细；
+    - `trace.json`：Chrome trace格式的时间线（每个GPU一条泳道），可以在Perfetto或 `chrome://tracing` 中打开。
+    """
+
+    def __init__(self, metrics_dir: str, interval=15):
+        self.metrics_dir = metrics_dir
+        self.interval = interval
+
+        self.ready_times = {}  # job_id -> 可以被调度（进入队列或重试的等待结束）的时刻
+        self.queue_waits = {}  # 运行中的任务 job_id -> 本次运行的排队时间
+        self.gpus = {}  # gpu_id -> GPUUsage
+        self.durations = {name: [] for name in DURATIONS}
+        self.runs = []
+        self.trace_events = []
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def attach(self, scheduler):
+        self.scheduler = scheduler
+        self.start_time = scheduler.now()
+        # 集群模式下GPU由agent提供，在第一次分配时才加入
+        for gpu_info in scheduler.gpu_infos:
+            self.get_gpu(str(gpu_info["id"]), self.start_time)
+        for job in scheduler.jobs:
+            if job.status is STATUS.WAITING:
+                self.ready_times[job.job_id] = self.start_time
+        # 任务长时间没有状态变化时也需要更新 `metrics.prom`
+        self.thread = threading.Thread(target=self.loop, daemon=True)
+        self.thread.start()
+
+    def loop(self):
+        # 由调度主线程写入，避免与 `on_status` 同时读写统计量
+        while not self.stopped.wait(self.interval):
+            self.scheduler.events.put((self.refresh, ()))
+
+    def refresh(self):
+        self.write_prometheus(self.scheduler.now())
+
+    def get_gpu(self, gpu_id: str, now):
+        if gpu_id not in self.gpus:
+            self.gpus[gpu_id] = GPUUsage(now)
+        return self.gpus[gpu_id]
+
+    def on_submit(self, job):
+        if job.status is STATUS.WAITING:
+            self.ready_times[job.job_id] = self.scheduler.now()
+
+    def on_status(self, job):
+        now = self.scheduler.now()
+        if job.status is STATUS.RUNNING:
+            ready_time = self.ready_times.pop(job.job_id, self.start_time)
+            self.queue_waits[job.job_id] = max(job.start_time - ready_time, 0)
+            for gpu_id in job.gpu_ids:
+                self.get_gpu(gpu_id, job.start_time).allocate(job.start_time)
+        else:
+            if job.job_id in self.queue_waits:
+                self.on_run_end(job, now)
+            else:
+                # 没有运行就结束的任务（如被取消）
+                self.ready_times.pop(job.job_id, None)
+            if job.status is STATUS.WAITING:
+                self.ready_times[job.job_id] = now
+            elif job.status is STATUS.RETRYING:
+                self.ready_times[job.job_id] = job.ready_time
+
+        self.trace_events.append(
+            {
+                "name": "jobs",
+                "ph": "C",
+                "pid": 0,
+                "ts": self.to_us(now),
+                "args": {"waiting": self.scheduler.jobs.num_waiting(), "running": len(self.scheduler.jobs.running)},
+            }
+        )
+
+    def on_run_end(self, job, now):
+        end_time = now if job.end_time is None else job.end_time
+        run = {
+            "job_id": job.job_id,
+            "name": str(job.name),
+            "attempt": job.attempts + 1 if job.status is STATUS.DONE else job.attempts,
+            "status": job.status.name,
+            "gpu_ids": list(job.gpu_ids),
+            "start_time": job.start_time - self.start_time,
+            "end_time": end_time - self.start_time,
+            "queue_wait": self.queue_waits.pop(job.job_id),
+            "launch_latency": None if job.spawn_time is None else max(job.spawn_time - job.start_time, 0),
+            "run_time": end_time - job.start_time,
+            "release_latency": max(now - end_time, 0),
+        }
+        self.runs.append(run)
+        for name in DURATIONS:
+            if run[name] is not None:
+                self.durations[name].append(run[name])
+        for gpu_id in job.gpu_ids:
+            self.gpus[gpu_id].release(end_time)
+
+    def close(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+        now = self.scheduler.now()
+        self.write_prometheus(now)
+        write_atomic(os.path.join(self.metrics_dir, "summary.json"), json.dumps(self.get_summary(now), indent=1))
+        write_atomic(os.path.join(self.metrics_dir, "trace.json"), json.dumps(self.get_trace()))
+        logger.info(f"The metrics of the scheduler are written to {self.metrics_dir}.")
+
+    def to_us(self, t):
+        return round((t - self.start_time) * 1e6)
+
+    def write_prometheus(self, now):
+        lines = []
+        for name, help_text in DURATIONS.items():
+            values = self.durations[name]
+            lines += [
+                f"# HELP runit_{name}_seconds {help_text}",
+                f"# TYPE runit_{name}_seconds summary",
+                f"runit_{name}_seconds_sum {sum(values)}",
+                f"runit_{name}_seconds_count {len(values)}",
+            ]
+
+        lines += ["# HELP runit_jobs The number of jobs in each status.", "# TYPE runit_jobs gauge"]
+        for status in STATUS:
+            lines.append(f'runit_jobs{{status="{status.name.lower()}"}} {self.scheduler.jobs.counts[status]}')
+
+        for name, help_text, getter in (
+            ("idle", "The time without any job on the GPU.", GPUUsage.get_idle_time),
+            ("busy", "The time with at least one job on the GPU.", GPUUsage.get_busy_time),
+        ):
+            lines += [f"# HELP runit_gpu_{name}_seconds {help_text}", f"# TYPE runit_gpu_{name}_seconds counter"]
+            for gpu_id, usage in self.gpus.items():
+                lines.append(f'runit_gpu_{name}_seconds{{gpu="{gpu_id}"}} {getter(usage, now)}')
+
+        lines += [
+            "# HELP runit_elapsed_seconds The time since the scheduler started.",
+            "# TYPE runit_elapsed_seconds gauge",
+            f"runit_elapsed_seconds {now - self.start_time}",
+        ]
+        write_atomic(os.path.join(self.metrics_dir, "metrics.prom"), "\n".join(lines) + "\n")
+
+    def get_summary(self, now):
+        durations = {}
+        for name, values in self.durations.items():
+            if not values:
+                continue
+            durations[name] = {
+                "count": len(values),
+                "mean": sum(values) / len(values),
+                "p50": percentile(values, 50),
+                "p90": percentile(values, 90),
+                "p99": percentile(values, 99),
+                "max": max(values),
+            }
+
+        elapsed = now - self.start_time
+        gpus = {}
+        for gpu_id, usage in self.gpus.items():
+            busy_time = usage.get_busy_time(now)
+            gpus[gpu_id] = {
+                "busy_seconds": busy_time,
+                "idle_seconds": usage.get_idle_time(now),
+                "utilization": busy_time / elapsed if elapsed > 0 else 0,
+            }
+        return {
+            "elapsed_seconds": elapsed,
+            "jobs": {status.name.lower(): self.scheduler.jobs.counts[status] for status in STATUS},
+            "idle_gpu_seconds": sum(x["idle_seconds"] for x in gpus.values()),
+            "durations": durations,
+            "gpus": gpus,
+            "runs": self.runs,
+        }
+
+    def get_trace(self):
+        # 每个GPU一条泳道（tid），每次运行在其占用的每个GPU上各有一个区间
+        lanes = {gpu_id: i for i, gpu_id in enumerate(self.gpus, start=1)}
+        events = [{"name": "process_name", "ph": "M", "pid": 0, "args": {"name": "runit"}}]
+        for gpu_id, tid in lanes.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": 0, "tid": tid, "args": {"name": f"GPU {gpu_id}"}})
+        for run in self.runs:
+            args = {k: v for k, v in run.items() if k not in ("name", "start_time", "end_time")}
+            for gpu_id in run["gpu_ids"]:
+                events.append(
+                    {
+                        "name": run["name"],
+                        "cat": run["status"].lower(),
+                        "ph": "X",
+                        "pid": 0,
+                        "tid": lanes[gpu_id],
+                        "ts": round(run["start_time"] * 1e6),
+                        "dur": round(run["run_time"] * 1e6),
+                        "args": args,
+                    }
+                )
+        return {"traceEvents": events + self.trace_events, "displayTimeUnit": "ms"}
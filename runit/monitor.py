@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+# @GitHub  : https://github.com/lartpang
+
+import logging
+import threading
+import time
+
+try:
+    import pynvml
+except ImportError:
+    pynvml = None
+
+from .jobs import STATUS
+from .launcher import JOB_ENV_KEY, get_job_marker
+
+logger = logging.getLogger(__name__)
+
+
+class GPUMonitor:
+    def __init__(self, available_gpu_ids) -> None:
+        if pynvml is None:
+            raise ImportError("GPUMonitor requires `nvidia-ml-py` (pynvml).")
+        pynvml.nvmlInit()
+
+        self.available_gpu_ids = available_gpu_ids
+        self.driver_version = pynvml.nvmlSystemGetDriverVersion()
+        self.cuda_version = pynvml.nvmlSystemGetCudaDriverVersion()
+
+        max_num_gpus = pynvml.nvmlDeviceGetCount()
+        if len(self.available_gpu_ids) > max_num_gpus:
+            raise ValueError("The number of gpus in config is larger than the number of available gpus.")
+        self.gpu_handlers = {idx: pynvml.nvmlDeviceGetHandleByIndex(idx) for idx in self.available_gpu_ids}
+        self.topology = None
+
+    def shutdown(self):
+        pynvml.nvmlShutdown()
+
+    def __repr__(self) -> str:
+        base_info = f"GPU Information: Driver: {self.driver_version}, CUDA:{self.cuda_version}\n\t"
+        gpu_infos = []
+        for idx in self.available_gpu_ids:
+            mem_info = pynvml.nvmlDeviceGetMemoryInfo(self.gpu_handlers[idx])
+            total_mem = int(mem_info.total / 1024 / 1024)
+            used_mem = int(mem_info.used / 1024 / 1024)
+            gpu_infos.append({"GPU ID": idx, "Total Mem(MB)": total_mem, "Used Mem(MB)": used_mem})
+        return base_info + "\n\t".join([str(x) for x in gpu_infos])
+
+    def get_total_mem_by_id(self, idx):
+        mem_info = pynvml.nvmlDeviceGetMemoryInfo(self.gpu_handlers[idx])
+        return int(mem_info.total / 1024 / 1024)
+
+    def get_used_mem_by_id(self, idx):
+        mem_info = pynvml.nvmlDeviceGetMemoryInfo(self.gpu_handlers[idx])
+        return int(mem_info.used / 1024 / 1024)
+
+    def get_available_mem_by_id(self, idx):
+        mem_info = pynvml.nvmlDeviceGetMemoryInfo(self.gpu_handlers[idx])
+        total_mem = int(mem_info.total / 1024 / 1024)
+        used_mem = int(mem_info.used / 1024 / 1024)
+        return total_mem - used_mem
+
+    def get_labels_by_id(self, idx):
+        # 从NVML读取的GPU属性，用作 `labels` 的默认值（参见 `labels.LabelIndex`）
+        name = pynvml.nvmlDeviceGetName(self.gpu_handlers[idx])
+        major, minor = pynvml.nvmlDeviceGetCudaComputeCapability(self.gpu_handlers[idx])
+        return {
+            "name": name.decode() if isinstance(name, bytes) else name,
+            "memory_gb": round(self.get_total_mem_by_id(idx) / 1024),
+            "compute_capability": f"{major}.{minor}",
+        }
+
+    def get_utilization_by_id(self, idx):
+        # 最近一个采样周期内GPU上有kernel在执行的时间比例（%）
+        return pynvml.nvmlDeviceGetUtilizationRates(self.gpu_handlers[idx]).gpu
+
+    def get_process_mem_by_id(self, idx):
+        # 每个在该GPU上运行的进程所占用的显存（MB）
+        process_mems = {}
+        for proc in pynvml.nvmlDeviceGetComputeRunningProcesses(self.gpu_handlers[idx]):
+            if proc.usedGpuMemory is None:  # 部分环境（如WSL）拿不到单个进程的显存
+                continue
+            process_mems[proc.pid] = int(proc.usedGpuMemory / 1024 / 1024)
+        return process_mems
+
+    def get_num_nvlinks(self, idx, other):
+        # idx与other之间处于活动状态的NVLink数，不支持NVLink的GPU为0
+        other_bus_id = pynvml.nvmlDeviceGetPciInfo(self.gpu_handlers[other]).busId
+        num_links = 0
+        for link in range(pynvml.NVML_NVLINK_MAX_LINKS):
+            try:
+                if pynvml.nvmlDeviceGetNvLinkState(self.gpu_handlers[idx], link) != pynvml.NVML_FEATURE_ENABLED:
+                    continue
+                remote_bus_id = pynvml.nvmlDeviceGetNvLinkRemotePciInfo(self.gpu_handlers[idx], link).busId
+            except pynvml.NVMLError:
+                break
+            if remote_bus_id == other_bus_id:
+                num_links += 1
+        return num_links
+
+    def get_topology(self):
+        # 按 `available_gpu_ids` 的顺序给出两两之间的连接（`nvidia-smi topo -m` 的记号），只检测一次
+        if self.topology is not None:
+            return self.topology
+        levels = {
+            pynvml.NVML_TOPOLOGY_INTERNAL: "PIX",
+            pynvml.NVML_TOPOLOGY_SINGLE: "PIX",
+            pynvml.NVML_TOPOLOGY_MULTIPLE: "PXB",
+            pynvml.NVML_TOPOLOGY_HOSTBRIDGE: "PHB",
+            pynvml.NVML_TOPOLOGY_NODE: "NODE",
+            pynvml.NVML_TOPOLOGY_SYSTEM: "SYS",
+        }
+        self.topology = []
+        for idx in self.available_gpu_ids:
+            row = []
+            for other in self.available_gpu_ids:
+                if other == idx:
+                    row.append("X")
+                    continue
+                num_links = self.get_num_nvlinks(idx, other)
+                if num_links > 0:
+                    row.append(f"NV{num_links}")
+                else:
+                    level = pynvml.nvmlDeviceGetTopologyCommonAncestor(
+                        self.gpu_handlers[idx], self.gpu_handlers[other]
+                    )
+                    row.append(levels.get(level, "SYS"))
+            self.topology.append(row)
+        logger.info(f"GPU topology: {self.topology}")
+        return self.topology
+
+
+def read_job_marker(pid: int):
+    # 从进程的环境变量中读取其所属的任务，读取失败时返回None
+    try:
+        with open(f"/proc/{pid}/environ", mode="rb") as f:
+            environ = f.read().split(b"\0")
+    except OSError:
+        return None
+    prefix = f"{JOB_ENV_KEY}=".encode()
+    for item in environ:
+        if item.startswith(prefix):
+            return item[len(prefix) :].decode()
+    return None
+
+
+class MemorySampler:
+    """在后台线程中周期性地采样每个GPU上各进程的显存占用，并将其归属到调度器启动的任务上。
+
+    任务的所有后代进程都继承了 `RUNIT_JOB` 环境变量，因此无需遍历进程树即可将一个进程归属到任务；
+    无法归属的占用视为其他用户（外部租户）的占用。
+    基于采样结果，`get_adjustments` 给出每个GPU在声明的预留之外的修正量：
+    任务运行超过 `warmup` 秒后，其预留由声明的 `memory` 替换为观测峰值的 `1 + safety_margin` 倍，
+    同时扣除外部租户的实时占用。
+    """
+
+    def __init__(self, monitor, interval=5, safety_margin=0.1, warmup=60):
+        self.monitor = monitor
+        self.interval = interval
+        self.safety_margin = safety_margin
+        self.warmup = warmup
+
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.markers = {}  # marker -> job
+        self.pid_markers = {}  # pid -> marker
+        self.peaks = {}  # job_id -> {gpu_id: MB}
+        self.external = {}  # gpu_id -> MB
+
+    def attach(self, scheduler):
+        self.gpu_ids = [str(gpu_info["id"]) for gpu_info in scheduler.gpu_infos]
+        self.sample()
+        self.thread = threading.Thread(target=self.loop, daemon=True)
+        self.thread.start()
+
+    def on_submit(self, job):
+        pass
+
+    def on_status(self, job):
+        with self.lock:
+            marker = get_job_marker(job.job_id)
+            if job.status is STATUS.RUNNING:
+                self.markers[marker] = job
+                self.peaks[job.job_id] = {}
+            else:
+                # 保留已结束任务的峰值，供 `get_peak` 查询
+                self.markers.pop(marker, None)
+
+    def close(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def loop(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                logger.warning(f"Failed to sample the GPU memory: {e}")
+
+    def sample(self):
+        samples = {gpu_id: self.monitor.get_process_mem_by_id(int(gpu_id)) for gpu_id in self.gpu_ids}
+        used = {gpu_id: self.monitor.get_used_mem_by_id(int(gpu_id)) for gpu_id in self.gpu_ids}
+
+        with self.lock:
+            alive_pids = set()
+            for gpu_id, process_mems in samples.items():
+                job_mems = {}
+                for pid, mem in process_mems.items():
+                    alive_pids.add(pid)
+                    if pid not in self.pid_markers:
+                        self.pid_markers[pid] = read_job_marker(pid)
+                    job = self.markers.get(self.pid_markers[pid])
+                    if job is not None:
+                        job_mems[job.job_id] = job_mems.get(job.job_id, 0) + mem
+
+                for job_id, mem in job_mems.items():
+                    peaks = self.peaks[job_id]
+                    peaks[gpu_id] = max(peaks.get(gpu_id, 0), mem)
+                self.external[gpu_id] = max(used[gpu_id] - sum(job_mems.values()), 0)
+
+            # 清理已经退出的进程
+            for pid in list(self.pid_markers):
+                if pid not in alive_pids:
+                    del self.pid_markers[pid]
+
+    def get_peak(self, job_id: int):
+        # 任务在单个GPU上的最大显存占用（MB），没有观测结果时返回None
+        with self.lock:
+            peaks = self.peaks.get(job_id)
+            return max(peaks.values()) if peaks else None
+
+    def get_adjustments(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            adjustments = {gpu_id: -self.external.get(gpu_id, 0) for gpu_id in self.gpu_ids}
+            for job in self.markers.values():
+                if now - job.start_time < self.warmup:
+                    continue
+                peaks = self.peaks.get(job.job_id, {})
+                for gpu_id in job.gpu_ids:
+                    if gpu_id not in peaks:
+                        continue
+                    effective = peaks[gpu_id] * (1 + self.safety_margin)
+                    adjustments[gpu_id] += job.info["memory"] - effective
+        return adjustments
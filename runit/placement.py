@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+# @GitHub  : https://github.com/lartpang
+
+from bisect import bisect_left, insort
+
+
+class FreeMemoryIndex:
+    """按剩余显存升序排列的GPU索引，放置决策只需二分查找而不必线性扫描。"""
+
+    def __init__(self, total_gpu_info: dict):
+        self.order = {gpu_id: idx for idx, gpu_id in enumerate(total_gpu_info)}
+        self.free = dict(total_gpu_info)
+        self.total = dict(total_gpu_info)
+        self.entries = sorted((mem, self.order[gpu_id], gpu_id) for gpu_id, mem in self.free.items())
+
+    def update(self, gpu_id: str, free_mem):
+        entry = (self.free[gpu_id], self.order[gpu_id], gpu_id)
+        del self.entries[bisect_left(self.entries, entry)]
+        self.free[gpu_id] = free_mem
+        insort(self.entries, (free_mem, self.order[gpu_id], gpu_id))
+
+    def first_fitting(self, memory) -> int:
+        # 第一个剩余显存不小于memory的条目的位置
+        return bisect_left(self.entries, (memory,))
+
+    def fitting(self, memory) -> list:
+        return self.entries[self.first_fitting(memory) :]
+
+
+def first_fit(index: FreeMemoryIndex, memory, num_gpus: int):
+    # 按配置中的顺序选择前num_gpus个满足需求的GPU
+    fitting = index.fitting(memory)
+    if len(fitting) < num_gpus:
+        return None
+    return [gpu_id for _, _, gpu_id in sorted(fitting, key=lambda x: x[1])[:num_gpus]]
+
+
+def best_fit(index: FreeMemoryIndex, memory, num_gpus: int):
+    # 选择剩余显存最少但仍满足需求的GPU，把大块显存留给大任务
+    start = index.first_fitting(memory)
+    if len(index.entries) - start < num_gpus:
+        return None
+    return [gpu_id for _, _, gpu_id in index.entries[start : start + num_gpus]]
+
+
+def worst_fit(index: FreeMemoryIndex, memory, num_gpus: int):
+    # 选择剩余显存最多的GPU，使负载尽量均衡
+    if num_gpus == 0:
+        return []
+    candidates = index.entries[-num_gpus:]
+    if len(candidates) < num_gpus or candidates[0][0] < memory:
+        return None
+    return [gpu_id for _, _, gpu_id in reversed(candidates)]
+
+
+def pack_then_spread(index: FreeMemoryIndex, memory, num_gpus: int):
+    # 优先（best-fit地）填满已经有任务的GPU，不够时再分散到空闲的GPU上
+    fitting = index.fitting(memory)
+    if len(fitting) < num_gpus:
+        return None
+    used = [gpu_id for mem, _, gpu_id in fitting if mem < index.total[gpu_id]]
+    idle = [gpu_id for mem, _, gpu_id in reversed(fitting) if mem >= index.total[gpu_id]]
+    return (used + idle)[:num_gpus]
+
+
+PLACEMENTS = {
+    "first-fit": first_fit,
+    "best-fit": best_fit,
+    "worst-fit": worst_fit,
+    "pack-then-spread": pack_then_spread,
+}
+
+
+def get_placement(name: str):
+    if name not in PLACEMENTS:
+        raise ValueError(f"Unknown placement {name}, it should be one of {list(PLACEMENTS)}.")
+    return PLACEMENTS[name]
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+# @GitHub  : https://github.com/lartpang
+
+import copy
+import logging
+from collections import deque
+
+from .labels import LabelIndex, get_selector_key
+from .placement import FreeMemoryIndex, get_placement
+from .topology import load_topology
+
+logger = logging.getLogger(__name__)
+
+
+def dominates(shape: tuple, other: tuple):
+    # shape中的每一项资源需求都不小于other，非数值项（如标签）需要完全相同
+    for x, y in zip(shape, other):
+        if isinstance(x, (int, float)) and isinstance(y, (int, float)):
+            if x < y:
+                return False
+        elif x != y:
+            return False
+    return True
+
+
+class Policy:
+    """资源策略：决定一个任务能否在当前的GPU状态下运行，以及运行在哪些GPU上。
+
+    所有状态都由调度主进程独占，`acquire` 与 `release` 均在主进程中调用。
+    设置了 `labels`（`labels.LabelIndex`）的策略支持任务的 `requires` 与 `prefers`。
+    """
+
+    labels = None
+
+    def setup(self, gpu_infos: list, config: dict):
+        raise NotImplementedError
+
+    def check(self, job_id: int, job_info: dict, warn: bool = True):
+        # warn为False时只补全默认值而不输出警告（如sweep中除第一个以外的任务）
+        if job_info["num_gpus"] > self.num_gpus:
+            raise ValueError(f"The number of gpus in job {job_id} is larger than the number of available gpus.")
+        requires = job_info.get("requires")
+        if requires and self.labels is not None:
+            num_matched = len(self.labels.match(requires))
+            if job_info["num_gpus"] > num_matched:
+                raise ValueError(f"Only {num_matched} gpus match the `requires` of job {job_id}: {requires}")
+
+    def job_shape(self, job_info: dict) -> tuple:
+        # 用于在一轮调度中剪枝：若某个shape已经放不下，则被它支配的更大的shape也放不下；
+        # `requires` 不同的任务可用的GPU不同，互不支配
+        return (job_info["num_gpus"], get_selector_key(job_info.get("requires")))
+
+    def acquire(self, job_info: dict):
+        raise NotImplementedError
+
+    def release(self, job_info: dict, gpu_ids: list):
+        raise NotImplementedError
+
+    def refresh(self):
+        # 每轮调度开始前调用，用于同步外部的资源状态
+        pass
+
+    def get_cpu_ids(self, job_info: dict):
+        # 任务被分配的CPU核心，为None时不绑定核心
+        return None
+
+    def clone(self):
+        # 用于在不影响真实状态的前提下推演未来的资源状态（如backfill中的预留检查）
+        return copy.deepcopy(self)
+
+
+class ExclusiveGPUPolicy(Policy):
+    """一个GPU同一时间只能被一个任务使用。
+
+    任务只使用满足 `requires` 的空闲GPU，并优先使用满足更多 `prefers` 条件的GPU；
+    配置了 `topology` 时，多卡任务在其中选择互联最好的一组。
+    """
+
+    def setup(self, gpu_infos: list, config: dict):
+        self.num_gpus = len(gpu_infos)
+        # 统计空余的GPU资源
+        self.available_gpus = deque(str(gpu_info["id"]) for gpu_info in gpu_infos)
+        self.topology = load_topology(gpu_infos, config)
+        self.labels = LabelIndex(gpu_infos)
+
+    def acquire(self, job_info: dict):
+        num_gpus = job_info["num_gpus"]
+        requires, prefers = job_info.get("requires"), job_info.get("prefers")
+        candidates = self.available_gpus
+        if requires:
+            matched = self.labels.match(requires)
+            candidates = [gpu_id for gpu_id in self.available_gpus if gpu_id in matched]
+        num_avaliable_gpus = len(candidates)
+        if num_gpus > num_avaliable_gpus:
+            logger.debug(f"Skipping {job_info}, not enough GPUs available ({num_gpus} > {num_avaliable_gpus}).")
+            return None
+        if candidates is self.available_gpus and not prefers and (self.topology is None or num_gpus <= 1):
+            return [self.available_gpus.popleft() for _ in range(num_gpus)]
+
+        candidates = list(candidates)
+        if prefers:
+            candidates = self.labels.sort(candidates, prefers)
+        if self.topology is None:
+            gpu_ids = candidates[:num_gpus]
+        else:
+            gpu_ids = self.topology.select(candidates, num_gpus)
+        for gpu_id in gpu_ids:
+            self.available_gpus.remove(gpu_id)
+        return gpu_ids
+
+    def release(self, job_info: dict, gpu_ids: list):
+        # 释放GPU资源回队列
+        self.available_gpus.extend(gpu_ids)
+
+
+class MemoryPolicy(Policy):
+    """一个GPU可以根据剩余显存被多个任务同时使用。
+
+    GPU的选择方式由配置中的 `placement` 指定，参见 `placement.PLACEMENTS`；
+    配置了 `topology` 时，多卡任务在所有放得下的GPU中选择互联最好的一组，互联相同时再按 `placement` 的偏好选择。
+    任务只使用满足 `requires` 的GPU（每个选择器各自维护一个按剩余显存排序的索引），
+    并优先使用满足更多 `prefers` 条件的GPU，其次才是 `placement` 的偏好。
+    """
+
+    def setup(self, gpu_infos: list, config: dict):
+        self.num_gpus = len(gpu_infos)
+        self.placement = get_placement(config.get("placement", "first-fit"))
+        # 跟踪空余的GPU显存
+        self.total_gpu_info = {str(gpu_info["id"]): gpu_info["memory"] for gpu_info in gpu_infos}
+        self.index = FreeMemoryIndex(self.total_gpu_info)
+        self.topology = load_topology(gpu_infos, config)
+        self.labels = LabelIndex(gpu_infos)
+        self.sub_indexes = {}  # requires -> (匹配的GPU, 只包含这些GPU的索引)
+
+    def check(self, job_id: int, job_info: dict, warn: bool = True):
+        super().check(job_id, job_info, warn)
+        if job_info.get("memory", 0) <= 0:
+            job_info["memory"] = 0  # 默认所需显存为0
+            if warn:
+                logger.warning(f"The memory of job {job_id} is not set, set it to 0 by default.")
+
+    def job_shape(self, job_info: dict) -> tuple:
+        return super().job_shape(job_info) + (job_info["memory"],)
+
+    def get_free_memory(self, gpu_id: str):
+        return self.total_gpu_info[gpu_id]
+
+    def update_index(self, gpu_id: str):
+        free_memory = self.get_free_memory(gpu_id)
+        self.index.update(gpu_id, free_memory)
+        for gpu_ids, index in self.sub_indexes.values():
+            if gpu_id in gpu_ids:
+                index.update(gpu_id, free_memory)
+
+    def get_index(self, requires: dict):
+        if not requires:
+            return self.index
+        key = get_selector_key(requires)
+        if key not in self.sub_indexes:
+            gpu_ids = self.labels.match(requires)
+            index = FreeMemoryIndex({x: self.index.total[x] for x in self.total_gpu_info if x in gpu_ids})
+            for gpu_id in gpu_ids:
+                index.update(gpu_id, self.index.free[gpu_id])
+            self.sub_indexes[key] = (gpu_ids, index)
+        return self.sub_indexes[key][1]
+
+    def get_available_gpu_ids(self, job_info: dict):
+        memory, num_gpus = job_info["memory"], job_info["num_gpus"]
+        index = self.get_index(job_info.get("requires"))
+        prefers = job_info.get("prefers")
+        if not prefers and (self.topology is None or num_gpus <= 1):
+            return self.placement(index, memory, num_gpus)
+        # 让放置策略给出所有放得下的GPU的偏好顺序，再按 `prefers` 和互联选择
+        candidates = self.placement(index, memory, len(index.fitting(memory)))
+        if prefers:
+            candidates = self.labels.sort(candidates, prefers)
+        if self.topology is None:
+            return candidates[:num_gpus] if len(candidates) >= num_gpus else None
+        return self.topology.select(candidates, num_gpus)
+
+    def acquire(self, job_info: dict):
+        available_gpu_ids = self.get_available_gpu_ids(job_info)
+        if available_gpu_ids is None:
+            logger.debug(f"Skipping {job_info}, not enough GPUs available ({self.total_gpu_info}).")
+            return None
+
+        logger.debug(f"Perform {job_info}!")
+        logger.debug(f"From {self.total_gpu_info}")
+        for gpu_id in available_gpu_ids:
+            self.total_gpu_info[gpu_id] -= job_info["memory"]
+            self.update_index(gpu_id)
+        logger.debug(f"To {self.total_gpu_info}")
+        return available_gpu_ids
+
+    def release(self, job_info: dict, gpu_ids: list):
+        logger.debug(f"Release {job_info}!")
+        logger.debug(f"From {self.total_gpu_info}")
+        for gpu_id in gpu_ids:
+            self.total_gpu_info[gpu_id] += job_info["memory"]
+            self.update_index(gpu_id)
+        logger.debug(f"To {self.total_gpu_info}")
+
+
+class AdaptiveMemoryPolicy(MemoryPolicy):
+    """在声明的显存预留的基础上，使用 `monitor.MemorySampler` 的实时观测结果修正每个GPU的剩余显存。
+
+    任务实际占用少于声明时允许超额分配，其他用户占用显存时则相应地减少可分配的显存。
+    """
+
+    def __init__(self, sampler):
+        self.sampler = sampler
+
+    def setup(self, gpu_infos: list, config: dict):
+        super().setup(gpu_infos, config)
+        self.adjustments = {gpu_id: 0 for gpu_id in self.total_gpu_info}
+
+    def get_free_memory(self, gpu_id: str):
+        return self.total_gpu_info[gpu_id] + self.adjustments[gpu_id]
+
+    def refresh(self):
+        adjustments = self.sampler.get_adjustments()
+        for gpu_id, adjustment in adjustments.items():
+            if adjustment != self.adjustments[gpu_id]:
+                self.adjustments[gpu_id] = adjustment
+                self.update_index(gpu_id)
+
+    def clone(self):
+        # 采样器包含线程和锁，不参与复制
+        sampler, self.sampler = self.sampler, None
+        try:
+            return copy.deepcopy(self)
+        finally:
+            self.sampler = sampler
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+# @GitHub  : https://github.com/lartpang
+
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+
+from .jobs import STATUS
+from .launcher import get_job_marker
+from .monitor import read_job_marker
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_command(command: str, ignore_args=("seed",)):
+    # 去掉只影响随机性的参数（如 `--seed 1`、`--seed=1`），使同一实验的不同重复共享同一份记录
+    for arg in ignore_args:
+        command = re.sub(rf"--{re.escape(arg)}(=|\s+)\S+", "", command)
+    return " ".join(command.split())
+
+
+def get_profile_key(job_info: dict, ignore_args=("seed",)):
+    return job_info.get("profile", normalize_command(job_info["command"], ignore_args))
+
+
+def percentile(values: list, q: float):
+    # nearest-rank百分位数
+    values = sorted(values)
+    rank = max(math.ceil(q / 100 * len(values)), 1)
+    return values[rank - 1]
+
+
+def read_rss(pid: int):
+    # 进程的常驻内存（MB），读取失败时返回0
+    try:
+        with open(f"/proc/{pid}/status", mode="r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0
+
+
+class ProfileStore:
+    """本地的任务资源记录（JSON），每个key保留最近的 `max_records` 条记录。"""
+
+    def __init__(self, path: str, max_records=20):
+        self.path = os.path.expanduser(path)
+        self.max_records = max_records
+        self.profiles = self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, mode="r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def get(self, key: str, field: str):
+        return [x[field] for x in self.profiles.get(key, []) if x.get(field) is not None]
+
+    def record(self, key: str, record: dict):
+        # 写入前重新读取，尽量保留其他调度器同时写入的记录
+        self.profiles = self.load()
+        records = self.profiles.setdefault(key, [])
+        records.append(record)
+        del records[: -self.max_records]
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, mode="w", encoding="utf-8") as f:
+            json.dump(self.profiles, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+
+
+class ProfileRecorder:
+    """记录每个任务的显存峰值、主机内存峰值和运行时长，并在之后的运行中用历史记录补全任务的资源需求。
+
+    未设置 `memory` 或 `estimated_duration` 的任务，会使用历史记录的 `percentile` 百分位数补全，
+    显存额外加上 `margin` 的余量；`tighten` 为真时，已声明的 `memory` 也会被收紧到该值。
+    显存峰值来自 `monitor.MemorySampler`，没有时只记录主机内存和运行时长；主机内存从 `/proc` 中采样，没有时不记录。
+    """
+
+    def __init__(
+        self, store: ProfileStore, memory_sampler=None, percentile=95, margin=0.1, tighten=False, interval=5
+    ):
+        self.store = store
+        self.memory_sampler = memory_sampler
+        self.percentile = percentile
+        self.margin = margin
+        self.tighten = tighten
+        self.interval = interval
+
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.rss_peaks = {}  # job_id -> MB
+        self.pid_markers = {}  # pid -> marker
+
+    def attach(self, scheduler):
+        self.scheduler = scheduler
+        for job in scheduler.jobs:
+            self.fill(job)
+        if not os.path.isdir("/proc"):
+            # 非Linux平台上无法读取进程的内存，只记录显存和运行时长
+            logger.info("No /proc on this platform, the host memory of the jobs is not recorded.")
+            return
+        self.thread = threading.Thread(target=self.loop, daemon=True)
+        self.thread.start()
+
+    def fill(self, job):
+        job_info = job.info
+        key = get_profile_key(job_info)
+
+        memories = self.store.get(key, "gpu_memory")
+        if memories:
+            memory = math.ceil(percentile(memories, self.percentile) * (1 + self.margin))
+            declared = job_info.get("memory", 0)
+            if declared <= 0 or (self.tighten and memory < declared):
+                logger.info(f"Set the memory of job {job.name} to {memory} from {len(memories)} records.")
+                job_info["memory"] = memory
+
+        durations = self.store.get(key, "wall_time")
+        if durations and job_info.get("estimated_duration") is None:
+            job_info["estimated_duration"] = percentile(durations, self.percentile)
+
+    def on_submit(self, job):
+        self.fill(job)
+
+    def on_status(self, job):
+        if job.status is STATUS.RUNNING:
+            with self.lock:
+                self.rss_peaks[job.job_id] = 0
+            return
+        with self.lock:
+            rss_peak = self.rss_peaks.pop(job.job_id, None)
+        if job.status is not STATUS.DONE or rss_peak is None:
+            # 只记录成功的运行
+            return
+
+        gpu_memory = None
+        if self.memory_sampler is not None:
+            gpu_memory = self.memory_sampler.get_peak(job.job_id)
+        record = {
+            "time": time.time(),
+            "gpu_memory": gpu_memory,
+            "host_rss": rss_peak or None,
+            "wall_time": self.scheduler.now() - job.start_time,
+        }
+        self.store.record(get_profile_key(job.info), record)
+
+    def close(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def loop(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                logger.warning(f"Failed to sample the host memory: {e}")
+
+    def sample(self):
+        prefix = get_job_marker("")
+        job_rss = {}
+        pids = [int(x) for x in os.listdir("/proc") if x.isdigit()]
+        # 只需读取新出现的进程的环境变量
+        self.pid_markers = {
+            pid: self.pid_markers[pid] if pid in self.pid_markers else read_job_marker(pid) for pid in pids
+        }
+        for pid, marker in self.pid_markers.items():
+            if marker is None or not marker.startswith(prefix):
+                continue
+            job_id = int(marker[len(prefix) :])
+            job_rss[job_id] = job_rss.get(job_id, 0) + read_rss(pid)
+
+        with self.lock:
+            for job_id, rss in job_rss.items():
+                if job_id in self.rss_peaks:
+                    self.rss_peaks[job_id] = max(self.rss_peaks[job_id], rss)
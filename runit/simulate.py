@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+# @GitHub  : https://github.com/lartpang
+
+import argparse
+import copy
+import heapq
+import logging
+import time
+
+from .engine import Scheduler, load_config
+from .launcher import Launcher
+from .placement import PLACEMENTS
+from .policy import ExclusiveGPUPolicy, MemoryPolicy
+
+logger = logging.getLogger("runit")
+
+
+class SimLauncher(Launcher):
+    """不真正执行命令，而是按任务的 `estimated_duration` 在虚拟时钟上安排任务结束。"""
+
+    def __init__(self, notify, default_duration=60):
+        super().__init__(notify)
+        self.default_duration = default_duration
+        self.clock = 0
+        self.pending = []
+        self.running = {}
+        self.busy_gpu_time = 0
+        self.reserved_mem_time = 0
+
+    def launch(self, job, gpu_ids: list):
+        duration = job.info.get("estimated_duration", self.default_duration)
+        heapq.heappush(self.pending, (self.clock + duration, job.job_id))
+        self.running[job.job_id] = (gpu_ids, job.info.get("memory", 0))
+
+    def advance(self):
+        # 将虚拟时钟推进到下一个任务结束的时刻，并统计这段时间内的资源占用
+        end_time, _ = self.pending[0]
+        busy_gpus = set()
+        reserved_mem = 0
+        for gpu_ids, memory in self.running.values():
+            busy_gpus.update(gpu_ids)
+            reserved_mem += memory * len(gpu_ids)
+        self.busy_gpu_time += len(busy_gpus) * (end_time - self.clock)
+        self.reserved_mem_time += reserved_mem * (end_time - self.clock)
+        self.clock = end_time
+
+        while self.pending and self.pending[0][0] == end_time:
+            _, job_id = heapq.heappop(self.pending)
+            del self.running[job_id]
+            self.notify(job_id, 0)
+
+
+class SimScheduler(Scheduler):
+    """在虚拟时钟上运行与真实调度器相同的调度逻辑，并统计调度本身消耗的CPU时间。"""
+
+    def __init__(self, *args, default_duration=60, **kwargs):
+        self.default_duration = default_duration
+        self.num_passes = 0
+        self.schedule_time = 0
+        super().__init__(*args, **kwargs)
+
+    def schedule(self):
+        start_time = time.process_time()
+        super().schedule()
+        self.schedule_time += time.process_time() - start_time
+        self.num_passes += 1
+
+    def now(self):
+        return self.launcher.clock
+
+    def create_launcher(self, name: str):
+        return SimLauncher(self.notify, default_duration=self.default_duration)
+
+    def wait_for_events(self):
+        if not self.launcher.pending:
+            raise RuntimeError(f"{self.jobs.num_waiting()} jobs can never be scheduled.")
+        self.launcher.advance()
+        self.process_events()
+
+
+def simulate(policy, gpu_infos: list, job_infos: list, config: dict, default_duration=60):
+    scheduler = SimScheduler(
+        policy,
+        gpu_infos=copy.deepcopy(gpu_infos),
+        job_infos=copy.deepcopy(job_infos),
+        config=config,
+        default_duration=default_duration,
+    )
+    scheduler.run()
+
+    launcher = scheduler.launcher
+    makespan = launcher.clock
+    total_mem = sum(gpu_info.get("memory", 0) for gpu_info in gpu_infos)
+    num_jobs = len(scheduler.jobs)
+    return {
+        "makespan": makespan,
+        # 所有任务都在0时刻提交，且模拟中不会失败重试
+        "mean_queue_wait": sum(job.start_time for job in scheduler.jobs) / num_jobs if num_jobs else 0,
+        "gpu_utilization": launcher.busy_gpu_time / (len(gpu_infos) * makespan) if makespan else 0,
+        "memory_utilization": launcher.reserved_mem_time / (total_mem * makespan) if makespan and total_mem else 0,
+        "num_passes": scheduler.num_passes,
+        "cpu_per_pass": scheduler.schedule_time / scheduler.num_passes if scheduler.num_passes else 0,
+        "cpu_per_job": scheduler.schedule_time / num_jobs if num_jobs else 0,
+    }
+
+
+def get_candidates(config: dict, placements=tuple(PLACEMENTS)):
+    # 参与比较的 (名字, 策略类, 配置)
+    candidates = [("exclusive", ExclusiveGPUPolicy, config)]
+    for placement in placements:
+        candidates.append((f"memory/{placement}", MemoryPolicy, dict(config, placement=placement)))
+    return candidates
+
+
+def get_args():
+    # fmt: off
+    parser = argparse.ArgumentParser(description="Replay a job file on a virtual clock and report makespan and utilization for each policy.")
+    parser.add_argument("--config", type=str, required=True, help="The path of the yaml containing all information of gpus and cmds.")
+    parser.add_argument("--placements", type=str, nargs="+", default=list(PLACEMENTS), choices=list(PLACEMENTS), help="The placements of the memory-based policy to compare.")
+    parser.add_argument("--backfill", action="store_true", help="Enable EASY backfilling regardless of the config.")
+    parser.add_argument("--default-duration", type=float, default=60, help="In seconds, the duration of the jobs without `estimated_duration`.")
+    # fmt: on
+    return parser.parse_args()
+
+
+def main():
+    args = get_args()
+    # 模拟时不输出每个任务的调度日志
+    logger.setLevel(logging.ERROR)
+
+    config = load_config(args.config)
+    if args.backfill:
+        config["backfill"] = True
+    gpu_infos, job_infos = config["gpu"], config["job"]
+
+    print(f"{'Policy':<24}{'Makespan(s)':>14}{'Mean Wait(s)':>14}{'GPU Util':>10}{'Mem Util':>10}{'CPU/Job(us)':>13}")
+    for name, policy_cls, policy_config in get_candidates(config, args.placements):
+        result = simulate(policy_cls(), gpu_infos, job_infos, policy_config, default_duration=args.default_duration)
+        print(
+            f"{name:<24}{result['makespan']:>14.1f}{result['mean_queue_wait']:>14.1f}"
+            f"{result['gpu_utilization']:>10.2%}{result['memory_utilization']:>10.2%}{result['cpu_per_job'] * 1e6:>13.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
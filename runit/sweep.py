@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+# @GitHub  : https://github.com/lartpang
+
+import math
+import random
+import re
+
+PLACEHOLDER = re.compile(r"\{(\w+)\}")
+
+
+def sample(rng: random.Random, values):
+    # 列表表示均匀地选择其中一个值，字典表示一个分布
+    if isinstance(values, (list, tuple)):
+        return rng.choice(values)
+    (kind, (low, high)), *_ = values.items()
+    if kind == "uniform":
+        return rng.uniform(low, high)
+    if kind == "log_uniform":
+        return math.exp(rng.uniform(math.log(low), math.log(high)))
+    if kind == "randint":
+        return rng.randint(low, high)
+    raise ValueError(f"Unknown distribution: {kind}")
+
+
+def fill(value, params: dict):
+    # 只替换参数名对应的占位符，命令中其他的花括号（如shell的 `${HOME}`）保持不变；
+    # 整个值就是一个占位符时保留参数原本的类型（如 `memory: "{mem}"`）
+    if isinstance(value, list):  # 如 `depends_on: ["train-{lr}"]`
+        return [fill(x, params) for x in value]
+    if not isinstance(value, str):
+        return value
+    match = PLACEHOLDER.fullmatch(value)
+    if match is not None and match.group(1) in params:
+        return params[match.group(1)]
+    return PLACEHOLDER.sub(lambda m: str(params[m.group(1)]) if m.group(1) in params else m.group(0), value)
+
+
+class Sweep:
+    """由一个模板和若干参数轴描述的一组任务。
+
+    ```yaml
+    - name: "lr{lr}-seed{seed}"
+      command: "python train.py --lr {lr} --seed {seed} --model {model}"
+      num_gpus: 1
+      memory: 4096
+      sweep:
+        grid: {lr: [0.1, 0.01], seed: [0, 1, 2]}  # 笛卡尔积
+        zip: {model: [a, b], ckpt: [x.pth, y.pth]}  # 逐个配对，长度必须相同
+        random: {samples: 10, seed: 0, axes: {wd: {log_uniform: [1.0e-5, 1.0e-2]}, dropout: [0.1, 0.3]}}
+    ```
+
+    grid、zip和random三部分之间再取笛卡尔积。第i个任务的参数可以直接由i算出（随机采样的种子也由i决定），
+    因此无论sweep有多大，都不需要预先展开，且每次展开的结果相同，可以配合 `--resume` 使用。
+    """
+
+    def __init__(self, job_info: dict, first_id: int):
+        self.template = {k: v for k, v in job_info.items() if k != "sweep"}
+        self.first_id = first_id
+        self.next_index = 0
+        self.pending = set()  # 已经生成但还没有启动过的任务
+        self.name_indexes = None  # 名字 -> 使用该名字的最后一个任务，只在被 `depends_on` 按名字引用时计算
+
+        spec = job_info["sweep"]
+        unknown = set(spec) - {"grid", "zip", "random"}
+        if unknown:
+            raise ValueError(f"Unknown keys in sweep: {unknown}")
+        # 每个轴为 (取值的个数, index -> 参数)
+        self.axes = []
+        for name, values in spec.get("grid", {}).items():
+            self.axes.append((len(values), lambda i, name=name, values=values: {name: values[i]}))
+        zipped = spec.get("zip", {})
+        if zipped:
+            lengths = {len(values) for values in zipped.values()}
+            if len(lengths) != 1:
+                raise ValueError(f"All lists in `zip` of a sweep must have the same length: {zipped}")
+            self.axes.append((lengths.pop(), lambda i: {name: values[i] for name, values in zipped.items()}))
+        if "random" in spec:
+            random_spec = spec["random"]
+            seed = random_spec.get("seed", 0)
+
+            def get_random_params(i):
+                rng = random.Random(f"{seed}:{i}")
+                return {name: sample(rng, values) for name, values in random_spec["axes"].items()}
+
+            self.axes.append((random_spec["samples"], get_random_params))
+        # 名字模板中的参数可以匹配任意内容，用于快速排除不可能由该sweep生成的名字；没有名字的任务只能通过ID引用
+        param_names = {*spec.get("grid", {}), *zipped, *spec.get("random", {}).get("axes", {})}
+        self.name_pattern = None
+        if "name" in self.template:
+            parts = PLACEHOLDER.split(str(self.template["name"]))
+            self.name_pattern = re.compile(
+                "".join(
+                    ".*" if i % 2 and x in param_names else re.escape("{%s}" % x if i % 2 else x)
+                    for i, x in enumerate(parts)
+                )
+            )
+
+    def __len__(self):
+        return math.prod(size for size, _ in self.axes)
+
+    @property
+    def name(self):
+        return self.template.get("name", self.template["command"])
+
+    def get_params(self, index: int):
+        # 混合进制分解，最后一个轴变化最快
+        params = {}
+        for size, get in reversed(self.axes):
+            index, i = divmod(index, size)
+            params.update(get(i))
+        return params
+
+    def get_job_info(self, index: int):
+        params = self.get_params(index)
+        return {key: fill(value, params) for key, value in self.template.items()}
+
+    def find(self, job):
+        """返回ID或名字为job的最后一个任务在sweep中的序号，sweep中没有该任务时返回None。"""
+        if str(job).isdigit() and self.first_id <= int(job) < self.first_id + len(self):
+            return int(job) - self.first_id
+        if self.name_pattern is None or not self.name_pattern.fullmatch(str(job)):
+            return None
+        if self.name_indexes is None:
+            self.name_indexes = {str(self.get_job_info(index)["name"]): index for index in range(len(self))}
+        return self.name_indexes.get(str(job))
+
+    def pop(self):
+        # 生成下一个任务，返回 (job_id, job_info)，全部生成后返回None
+        if self.next_index >= len(self):
+            return None
+        index = self.next_index
+        self.next_index += 1
+        return self.first_id + index, self.get_job_info(index)
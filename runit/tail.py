@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+# @GitHub  : https://github.com/lartpang
+
+import argparse
+import glob
+import os
+import re
+import sys
+import time
+
+from .logs import to_safe_name
+
+
+def find_log(log_dir: str, job: str):
+    # job可以是任务的ID或名字；日志文件名为 `<ID>-<名字>.log`（参见 `logs.get_log_name`）
+    if job.isdigit():
+        paths = glob.glob(os.path.join(log_dir, f"{job}-*.log"))
+    else:
+        # 名字需要完整匹配，`train` 不应匹配到 `a-train` 的日志
+        pattern = re.compile(rf"\d+-{re.escape(to_safe_name(job))}\.log")
+        paths = [os.path.join(log_dir, x) for x in os.listdir(log_dir) if pattern.fullmatch(x)]
+    if not paths:
+        raise FileNotFoundError(f"Cannot find the log of job {job} in {log_dir}.")
+    return max(paths, key=os.path.getmtime)
+
+
+def tail(path: str, num_lines=20, block_size=8192):
+    # 从文件末尾向前按块读取，只读取需要的部分
+    with open(path, mode="rb") as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        data = b""
+        while end > 0 and data.count(b"\n") <= num_lines:
+            start = max(end - block_size, 0)
+            f.seek(start)
+            data = f.read(end - start) + data
+            end = start
+    return [x.decode("utf-8", errors="replace") for x in data.splitlines()[-num_lines:]]
+
+
+def follow(path: str, interval=0.5):
+    # 类似 `tail -f`，文件被轮转时重新打开
+    f = open(path, mode="rb")
+    f.seek(0, os.SEEK_END)
+    try:
+        while True:
+            line = f.readline()
+            if line:
+                sys.stdout.write(line.decode("utf-8", errors="replace"))
+                sys.stdout.flush()
+                continue
+            if os.path.exists(path) and os.stat(path).st_ino != os.fstat(f.fileno()).st_ino:
+                f.close()
+                f = open(path, mode="rb")
+                continue
+            time.sleep(interval)
+    finally:
+        f.close()
+
+
+def main():
+    # fmt: off
+    parser = argparse.ArgumentParser(description="Show the last lines of the output of a job.")
+    parser.add_argument("job", type=str, help="The id or the name of the job.")
+    parser.add_argument("--log-dir", type=str, required=True, help="The directory of the logs of the jobs.")
+    parser.add_argument("-n", "--lines", type=int, default=20, help="The number of lines to show.")
+    parser.add_argument("-f", "--follow", action="store_true", help="Keep printing the new lines.")
+    # fmt: on
+    args = parser.parse_args()
+
+    path = find_log(args.log_dir, args.job)
+    print("\n".join(tail(path, args.lines)))
+    if args.follow:
+        try:
+            follow(path)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
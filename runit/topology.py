@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+# @GitHub  : https://github.com/lartpang
+
+import re
+
+# 两个GPU之间的连接（与 `nvidia-smi topo -m` 的记号相同）-> 通信代价，越小越好
+LINK_COSTS = {
+    "X": 0,  # 同一个GPU
+    "PIX": 10,  # 经过同一个PCIe交换芯片
+    "PXB": 20,  # 经过多个PCIe交换芯片
+    "PHB": 30,  # 经过CPU的PCIe主桥
+    "NODE": 40,  # 经过同一个NUMA节点内的多个主桥
+    "SYS": 50,  # 跨NUMA节点（经过CPU之间的互联）
+}
+NVLINK = re.compile(r"NV(\d+)")
+
+
+def get_link_cost(link) -> int:
+    if isinstance(link, (int, float)):
+        return link
+    match = NVLINK.fullmatch(link)
+    if match is not None:
+        # NVLink优于任何PCIe路径，连接数越多带宽越高
+        return max(1, 9 - int(match.group(1)))
+    if link not in LINK_COSTS:
+        raise ValueError(f"Unknown link {link}, it should be NV<n> or one of {list(LINK_COSTS)}.")
+    return LINK_COSTS[link]
+
+
+class Topology:
+    """GPU之间的连接矩阵，用于为多卡任务选择互联最好的一组GPU。
+
+    配置中的 `topology` 按 `gpu` 的顺序给出每两个GPU之间的连接，可以直接从 `nvidia-smi topo -m` 中复制，
+    也可以是数值形式的代价；为 `nvml` 时在启动时通过NVML检测一次。
+
+    ```yaml
+    topology:
+      - "X   NV2 SYS SYS"
+      - "NV2 X   SYS SYS"
+      - "SYS SYS X   NV2"
+      - "SYS SYS NV2 X"
+    ```
+
+    一组GPU的代价为 (其中最差的一条连接, 所有连接之和)：all-reduce的速度主要受限于最慢的一段链路。
+    """
+
+    def __init__(self, gpu_ids: list, links: list):
+        rows = [row.split() if isinstance(row, str) else list(row) for row in links]
+        if len(rows) != len(gpu_ids) or any(len(row) != len(gpu_ids) for row in rows):
+            raise ValueError(f"The topology should be a {len(gpu_ids)}x{len(gpu_ids)} matrix in the order of `gpu`.")
+        gpu_ids = [str(gpu_id) for gpu_id in gpu_ids]
+        self.costs = {
+            gpu_id: {other: get_link_cost(link) for other, link in zip(gpu_ids, row)}
+            for gpu_id, row in zip(gpu_ids, rows)
+        }
+
+    def __deepcopy__(self, memo):
+        # 拓扑不会改变，policy的副本可以共享同一个对象
+        return self
+
+    def get_cost(self, gpu_ids: list) -> tuple:
+        worst = total = 0
+        for i, gpu_id in enumerate(gpu_ids):
+            for other in gpu_ids[i + 1 :]:
+                cost = self.costs[gpu_id][other]
+                worst = max(worst, cost)
+                total += cost
+        return worst, total
+
+    def select(self, candidates: list, num_gpus: int):
+        """从按放置策略的偏好排列的candidates中选出num_gpus个互联最好的GPU。
+
+        以每个候选为起点，贪心地加入与已选GPU之间最差连接最小的候选，再比较得到的各组的代价；
+        代价相同时保持放置策略的偏好。候选不足时返回None。
+        """
+        if len(candidates) < num_gpus:
+            return None
+        if num_gpus <= 1 or len(candidates) == num_gpus:
+            return candidates[:num_gpus]
+
+        best, best_cost = None, None
+        for seed in candidates:
+            selected = [seed]
+            rest = [x for x in candidates if x != seed]
+            while len(selected) < num_gpus:
+                nearest = min(rest, key=lambda x: max(self.costs[x][y] for y in selected))
+                selected.append(nearest)
+                rest.remove(nearest)
+            cost = self.get_cost(selected)
+            if best_cost is None or cost < best_cost:
+                best, best_cost = selected, cost
+        return sorted(best, key=candidates.index)
+
+
+def load_topology(gpu_infos: list, config: dict):
+    # 配置中没有 `topology` 时返回None，即不考虑GPU之间的连接
+    links = config.get("topology")
+    if links is None:
+        return None
+    gpu_ids = [gpu_info["id"] for gpu_info in gpu_infos]
+    if links == "nvml":
+        from .monitor import GPUMonitor
+
+        gpu_monitor = GPUMonitor(available_gpu_ids=gpu_ids)
+        try:
+            links = gpu_monitor.get_topology()
+        finally:
+            gpu_monitor.shutdown()
+    return Topology(gpu_ids, links)
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# @GitHub  : https://github.com/lartpang
+
+import json
+import logging
+import threading
+import time
+
+from .jobs import STATUS
+
+logger = logging.getLogger(__name__)
+
+
+class FakeUtilization:
+    """用于测试的GPU利用率来源，与 `monitor.GPUMonitor` 一样提供 `get_utilization_by_id`。
+
+    给出path时每次都从该JSON（`{"0": 95, "1": 0}`）中读取，否则使用 `values`；未给出的GPU视为0。
+    """
+
+    def __init__(self, path: str = None, values: dict = None):
+        self.path = path
+        self.values = dict(values or {})
+
+    def get_utilization_by_id(self, idx):
+        values = self.values
+        if self.path is not None:
+            with open(self.path, mode="r", encoding="utf-8") as f:
+                values = json.load(f)
+        return values.get(str(idx), 0)
+
+
+class Watchdog:
+    """在后台线程中周期性地采样GPU利用率，找出GPU长时间空闲（如在NCCL中死锁、卡在dataloader中）的任务。
+
+    任务的所有GPU的利用率都不超过 `threshold`（%）并持续 `window` 秒后，`action` 为 `warn` 时只输出警告，
+    为 `kill` 时由调度器停止该任务（按失败处理，参见 `Scheduler.on_idle`）。
+    `source` 需要提供 `get_utilization_by_id(idx)`，如 `monitor.GPUMonitor` 或 `FakeUtilization`。
+    多个任务共用一个GPU时无法区分各自的利用率，只要GPU忙碌，其上的任务都视为活跃。
+    """
+
+    def __init__(self, source, window=1800, threshold=5, action="warn", interval=30, close_source=False):
+        if action not in ("warn", "kill"):
+            raise ValueError(f"Unknown action of the watchdog: {action}")
+        self.source = source
+        self.window = window
+        self.threshold = threshold
+        self.action = action
+        self.interval = interval
+        self.close_source = close_source
+
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.active_times = {}  # 运行中的任务 job_id -> (job, GPU最后一次忙碌的时刻)
+        self.flagged = set()  # 已经报告过的任务
+
+    def attach(self, scheduler):
+        self.scheduler = scheduler
+        self.thread = threading.Thread(target=self.loop, daemon=True)
+        self.thread.start()
+
+    def on_submit(self, job):
+        pass
+
+    def on_status(self, job):
+        with self.lock:
+            if job.status is STATUS.RUNNING and job.gpu_ids:
+                self.active_times[job.job_id] = (job, time.monotonic())
+            else:
+                self.active_times.pop(job.job_id, None)
+                self.flagged.discard(job.job_id)
+
+    def close(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+        if self.close_source:
+            self.source.shutdown()
+
+    def loop(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.warning(f"Failed to sample the GPU utilization: {e}")
+
+    def check(self):
+        with self.lock:
+            gpu_ids = {gpu_id for job, _ in self.active_times.values() for gpu_id in job.gpu_ids}
+        utilization = {gpu_id: self.source.get_utilization_by_id(int(gpu_id)) for gpu_id in gpu_ids}
+
+        now = time.monotonic()
+        idle_jobs = []
+        with self.lock:
+            for job_id, (job, active_time) in self.active_times.items():
+                if any(utilization.get(gpu_id, 0) > self.threshold for gpu_id in job.gpu_ids):
+                    self.active_times[job_id] = (job, now)
+                    self.flagged.discard(job_id)
+                elif now - active_time >= self.window and job_id not in self.flagged:
+                    self.flagged.add(job_id)
+                    idle_jobs.append((job, list(job.gpu_ids), now - active_time))
+
+        for job, gpu_ids, idle_time in idle_jobs:
+            logger.warning(f"The GPUs {','.join(gpu_ids)} of job {job.name} have been idle for {idle_time:.0f}s.")
+            if self.action == "kill":
+                # 由调度主线程停止任务
+                self.scheduler.events.put((self.scheduler.on_idle, (job.job_id,)))
@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+# @GitHub  : https://github.com/lartpang
+
+from runit.jobs import STATUS, JobTable
+
+
+def test_unblocked_job_is_popped_once():
+    jobs = JobTable([{"name": "a", "command": "a", "num_gpus": 1}, {"name": "b", "command": "b", "num_gpus": 1}])
+    # 与建立依赖关系时相同：加入后被阻塞，上游完成后回到等待队列
+    jobs.set_status(jobs[1], STATUS.BLOCKED)
+    jobs.set_status(jobs[1], STATUS.WAITING)
+
+    assert [job.job_id for job in jobs.iter_waiting()] == [0, 1]
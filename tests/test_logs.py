@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+# @GitHub  : https://github.com/lartpang
+
+import gzip
+import os
+import time
+
+from runit.jobs import Job
+from runit.launcher import pump, start_process
+from runit.logs import JobLogger, open_job_log
+
+
+def run_attempt(job_logger, job, output: bytes):
+    job_log = open_job_log(*job_logger.get_args(job))
+    job_log.write(output)
+    job_log.close()
+    job.attempts += 1
+
+
+def test_compressed_log_keeps_every_attempt(tmp_path):
+    job_logger = JobLogger(str(tmp_path), compress=True)
+    job = Job(0, {"name": "flaky", "command": "python train.py"})
+    for attempt in range(1, 4):
+        run_attempt(job_logger, job, f"output of attempt {attempt}\n".encode())
+
+    assert os.listdir(tmp_path) == ["0-flaky.log.gz"]
+    with gzip.open(tmp_path / "0-flaky.log.gz", mode="rt", encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    assert [x for x in lines if x.startswith("output")] == [f"output of attempt {i}" for i in range(1, 4)]
+    assert [x.split()[4] for x in lines if x.startswith("====")] == ["1:", "2:", "3:"]
+
+
+def test_pump_returns_when_the_job_exits(tmp_path):
+    # 后台的孙进程仍然持有stdout时，也应在shell退出后立即结束
+    log_args = JobLogger(str(tmp_path)).get_args(Job(0, {"name": "bg", "command": "bg"}))
+    sub_proc, job_log = start_process("sleep 5 & echo started", dict(os.environ), log_args, new_session=True)
+    start_time = time.monotonic()
+    assert pump(sub_proc, job_log) == 0
+    assert time.monotonic() - start_time < 2
+    assert "started" in (tmp_path / "0-bg.log").read_text(encoding="utf-8")
+    os.killpg(sub_proc.pid, 9)